@@ -5,14 +5,19 @@ SanatanaGPT Local Admin Ingestion CLI
 Usage:
   python ingest.py --file "gita.pdf" --title "Bhagavad Gita" --language "Sanskrit"
   python ingest.py --file "gita.pdf" --title "Bhagavad Gita" --language "Sanskrit" --description "Commentary by Swami Mukundananda"
+  python ingest.py --file "gita.pdf" --update <scripture_id>
   python ingest.py --wipe
   python ingest.py --approve <request_id>
+  python ingest.py --strip-chunk-metadata
 """
 import argparse
 import os
 import sys
 import time
 import asyncio
+import hashlib
+import sqlite3
+from array import array
 from pathlib import Path
 from datetime import datetime, timezone
 
@@ -43,9 +48,8 @@ if not firebase_admin._apps:
 
 db = firestore.client()
 
-# Local embedding client
+# Local embedding client (loaded lazily — embedding worker processes load their own copy)
 from sentence_transformers import SentenceTransformer
-model = SentenceTransformer('all-mpnet-base-v2')
 
 # Text processing
 import fitz  # pymupdf
@@ -55,77 +59,402 @@ from google.cloud.firestore_v1.vector import Vector
 # ─── Embedding Helper ─────────────────────────────────────────────
 EMBED_MODEL = "all-mpnet-base-v2"
 EMBED_DIMS = 768
-EMBED_BATCH_SIZE = 50  # Huge batch size since it's local GPU/CPU hardware!
-
-async def embed_batch(texts: list[str]) -> list[list[float]]:
-    """Embed a batch of texts instantly using local hardware."""
+EMBED_BATCH_SIZE = 32  # Sweet spot for mpnet on CPU; larger batches mostly add padding
+EMBED_WORKERS = 0      # 0 = embed in-process; N = pool of N worker processes
+WRITE_CONCURRENCY = 4  # Firestore batch commits in flight
+WRITE_BATCH_OPS = 490  # Firestore caps a batch at 500 writes
+
+EMBED_BACKEND = "torch"  # torch | torch-int8 | onnx | onnx-int8 (same choices as the backend)
+EMBED_ONNX_INT8_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+_model = None
+
+def load_model(backend: str):
+    """Load the encoder on a CPU backend; mirrors app.services.embedding.load_model."""
+    if backend == "onnx":
+        return SentenceTransformer(EMBED_MODEL, backend="onnx")
+    if backend == "onnx-int8":
+        return SentenceTransformer(EMBED_MODEL, backend="onnx", model_kwargs={"file_name": EMBED_ONNX_INT8_FILE})
+    model = SentenceTransformer(EMBED_MODEL)
+    if backend == "torch-int8":
+        import torch
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+def get_model():
+    global _model
+    if _model is None:
+        _model = load_model(EMBED_BACKEND)
+    return _model
+
+def init_embed_worker(num_workers: int, backend: str):
+    """Process-pool initializer: split the cores between workers and load the model once."""
+    global EMBED_BACKEND
+    import torch
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // num_workers))
+    EMBED_BACKEND = backend
+    get_model()
+
+def encode_texts(texts: list[str]) -> list[list[float]]:
+    """Embed a batch of texts using local hardware (runs in a worker)."""
     # sentence-transformers encode returns numpy arrays, we convert them to python lists
-    embeddings = model.encode(texts)
+    embeddings = get_model().encode(texts, batch_size=len(texts))
     return [e.tolist() for e in embeddings]
 
+# ─── Content Hashes & Embedding Cache ─────────────────────────────
+EMBED_CACHE_PATH = Path(__file__).parent / ".embed_cache.sqlite3"
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Local content-hash → vector store, so unchanged text is never re-embedded across runs.
+
+    Vectors are keyed by model *and* backend: int8 and ONNX encoders give slightly
+    different vectors, which must not be reused as torch ones (or vice versa).
+    """
+
+    def __init__(self, path: Path = EMBED_CACHE_PATH, model_name: str = EMBED_MODEL, backend: str = "torch"):
+        self.model_name = f"{model_name}@{backend}"
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (model TEXT, hash TEXT, vector BLOB, PRIMARY KEY (model, hash))"
+        )
+
+    def get(self, content_hash: str):
+        row = self.conn.execute(
+            "SELECT vector FROM embeddings WHERE model = ? AND hash = ?", (self.model_name, content_hash)
+        ).fetchone()
+        return array("f", row[0]).tolist() if row else None
+
+    def put_many(self, items: list[tuple[str, list[float]]]):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)",
+            [(self.model_name, h, array("f", vec).tobytes()) for h, vec in items]
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def load_existing_chunks(scripture_id: str) -> dict:
+    """Map content hash → [(doc_id, chunkIndex)] for a scripture's current chunks, without embeddings."""
+    existing = {}
+    docs = db.collection("scripture_chunks").where("scriptureId", "==", scripture_id) \
+        .select(["text", "chunkIndex", "contentHash"]).stream()
+    for doc in docs:
+        data = doc.to_dict()
+        content_hash = data.get("contentHash") or chunk_hash(data.get("text", ""))
+        existing.setdefault(content_hash, []).append((doc.id, data.get("chunkIndex", 0)))
+    return existing
+
+
 # ─── File Reading ─────────────────────────────────────────────────
-def read_file(filepath: str) -> str:
-    """Extract text from PDF or TXT file."""
+TEXT_BLOCK_SIZE = 64 * 1024  # characters per block when streaming a TXT file
+
+def iter_pages(filepath: str):
+    """Yield the document's text one PDF page (or one TXT block) at a time."""
     path = Path(filepath)
     if not path.exists():
         print(f"ERROR: File not found: {filepath}")
         sys.exit(1)
 
     if path.suffix.lower() == ".pdf":
-        doc = fitz.open(str(path))
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        print(f"  📄 Extracted {len(text):,} characters from {len(doc)} PDF pages")
-        return text
+        with fitz.open(str(path)) as doc:
+            print(f"  📄 Streaming text from {len(doc)} PDF pages")
+            for page in doc:
+                yield page.get_text()
+    else:
+        print(f"  📄 Streaming text file {path.name}")
+        with path.open("r", encoding="utf-8", errors="ignore") as f:
+            while block := f.read(TEXT_BLOCK_SIZE):
+                yield block
+
+
+# ─── Chunking ─────────────────────────────────────────────────────
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 100
+
+def iter_chunks(pages, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP):
+    """Incrementally split a stream of page texts into chunks.
+
+    Text is buffered until it holds several chunks' worth, split, and every chunk but
+    the last is emitted; the last (possibly incomplete) chunk seeds the next buffer, so
+    memory stays bounded by a few pages regardless of document size.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    parts = []
+    buffered = 0
+    for page_text in pages:
+        parts.append(page_text)
+        buffered += len(page_text)
+        if buffered < chunk_size * 8:
+            continue
+        pieces = splitter.split_text("".join(parts))
+        yield from pieces[:-1]
+        parts = [pieces[-1]] if pieces else []
+        buffered = sum(len(p) for p in parts)
+    if parts:
+        yield from splitter.split_text("".join(parts))
+
+def iter_batches(items, size: int):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ─── Parallel Pipeline ───────────────────────────────────────────
+class StageStats:
+    """Items processed and busy time for one pipeline stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+
+    def add(self, items: int, seconds: float):
+        self.items += items
+        self.busy += seconds
+
+    def report(self, wall: float) -> str:
+        rate = self.items / self.busy if self.busy else 0.0
+        util = self.busy / wall * 100 if wall else 0.0
+        return f"{self.name:<8} {self.items:>7} chunks  {rate:>8.1f} chunks/s busy  {util:>5.0f}% busy"
+
+
+async def run_pipeline(filepath: str, scripture_id: str, embed_workers: int,
+                       embed_batch_size: int, write_concurrency: int, existing: dict = None) -> dict:
+    """Producer/consumer ingestion: extract+chunk → embed (worker pool) → Firestore commits.
+
+    Queues between the stages are bounded, so a slow stage applies backpressure to the
+    ones before it instead of letting chunks pile up in memory.
+
+    Every chunk is content-hashed. Chunks found in `existing` (hash → [(doc_id, chunkIndex)])
+    are kept as-is, or only get their chunkIndex rewritten if they moved; the rest take
+    their vector from the local embedding cache when possible and are embedded otherwise.
+    Whatever is left in `existing` afterwards is returned for deletion.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    loop = asyncio.get_running_loop()
+    if embed_workers > 0:
+        # spawn, not fork: the Firestore gRPC channel is already open and gRPC isn't fork-safe
+        pool = ProcessPoolExecutor(max_workers=embed_workers, initializer=init_embed_worker,
+                                   initargs=(embed_workers, EMBED_BACKEND),
+                                   mp_context=multiprocessing.get_context("spawn"))
     else:
-        text = path.read_text(encoding="utf-8", errors="ignore")
-        print(f"  📄 Read {len(text):,} characters from text file")
-        return text
+        pool = ThreadPoolExecutor(max_workers=1)
+    embed_slots = max(1, embed_workers)
+
+    embed_queue = asyncio.Queue(maxsize=embed_slots * 2)
+    write_queue = asyncio.Queue(maxsize=write_concurrency * 2)
+    stats = {name: StageStats(name) for name in ("extract", "embed", "write")}
+    counts = {"total": 0, "written": 0, "skipped": 0, "reindexed": 0, "cache_hits": 0, "embedded": 0}
+    existing = existing if existing is not None else {}
+    cache = EmbeddingCache(backend=EMBED_BACKEND)
+    seen_ids = set()
+    start = time.perf_counter()
+
+    def new_doc_id(content_hash: str) -> str:
+        # Content-addressed, so re-runs never collide with chunks that were kept
+        doc_id = f"{scripture_id}_chunk_{content_hash[:16]}"
+        n = 1
+        while doc_id in seen_ids:
+            n += 1
+            doc_id = f"{scripture_id}_chunk_{content_hash[:16]}_{n}"
+        seen_ids.add(doc_id)
+        return doc_id
+
+    async def produce():
+        batches = iter_batches(iter_chunks(iter_pages(filepath)), embed_batch_size)
+        next_index = 0
+        while True:
+            t0 = time.perf_counter()
+            texts = await asyncio.to_thread(next, batches, None)
+            if texts is None:
+                break
+            stats["extract"].add(len(texts), time.perf_counter() - t0)
+
+            to_embed = []
+            for text in texts:
+                idx = next_index
+                next_index += 1
+                content_hash = chunk_hash(text)
+                matches = existing.get(content_hash)
+                if matches:
+                    doc_id, old_index = matches.pop()
+                    if not matches:
+                        del existing[content_hash]
+                    seen_ids.add(doc_id)
+                    if old_index == idx:
+                        counts["skipped"] += 1
+                    else:
+                        counts["reindexed"] += 1
+                        await write_queue.put(("reindex", doc_id, idx, None, None, None))
+                    continue
+                vector = cache.get(content_hash)
+                if vector is not None:
+                    counts["cache_hits"] += 1
+                    await write_queue.put(("set", new_doc_id(content_hash), idx, text, content_hash, vector))
+                else:
+                    to_embed.append((idx, text, content_hash))
+            if to_embed:
+                await embed_queue.put(to_embed)
+        counts["total"] = next_index
+        for _ in range(embed_slots):
+            await embed_queue.put(None)
+
+    async def embed():
+        while (items := await embed_queue.get()) is not None:
+            texts = [text for _, text, _ in items]
+            t0 = time.perf_counter()
+            embeddings = await loop.run_in_executor(pool, encode_texts, texts)
+            stats["embed"].add(len(texts), time.perf_counter() - t0)
+            counts["embedded"] += len(texts)
+            cache.put_many([(h, vec) for (_, _, h), vec in zip(items, embeddings)])
+            for (idx, text, content_hash), embedding in zip(items, embeddings):
+                await write_queue.put(("set", new_doc_id(content_hash), idx, text, content_hash, embedding))
+
+    async def write():
+        done = False
+        while not done:
+            ops = []
+            while len(ops) < WRITE_BATCH_OPS:
+                item = await write_queue.get()
+                if item is None:
+                    done = True
+                    break
+                ops.append(item)
+                if write_queue.empty() and len(ops) >= embed_batch_size:
+                    break
+            if not ops:
+                continue
+            t0 = time.perf_counter()
+            await asyncio.to_thread(commit_chunks, scripture_id, ops)
+            stats["write"].add(len(ops), time.perf_counter() - t0)
+            counts["written"] += len(ops)
+            print(f"  📊 Progress: {counts['written']} chunks written, {counts['skipped']} unchanged")
+
+    async def feed():
+        await asyncio.gather(produce(), *(embed() for _ in range(embed_slots)))
+        for _ in range(write_concurrency):
+            await write_queue.put(None)
+
+    try:
+        # A failure in any stage propagates here instead of leaving the others blocked
+        await asyncio.gather(feed(), *(write() for _ in range(write_concurrency)))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        cache.close()
+
+    wall = time.perf_counter() - start
+    print(f"  ⏱️  Stage throughput over {wall:.1f}s (lowest chunks/s is the bottleneck):")
+    for stage in stats.values():
+        print(f"     {stage.report(wall)}")
+    counts["stale"] = [doc_id for matches in existing.values() for doc_id, _ in matches]
+    return counts
+
+def commit_chunks(scripture_id: str, ops: list):
+    """Write one Firestore batch of chunk upserts / chunkIndex moves.
+
+    Scripture metadata (title, language, author) is not copied onto chunks; the API joins
+    it from the scripture document at query time.
+    """
+    batch_obj = db.batch()
+    for kind, doc_id, global_idx, text, content_hash, embedding in ops:
+        chunk_ref = db.collection("scripture_chunks").document(doc_id)
+        if kind == "reindex":
+            batch_obj.update(chunk_ref, {"chunkIndex": global_idx})
+            continue
+        batch_obj.set(chunk_ref, {
+            "scriptureId": scripture_id,
+            "text": text,
+            "contentHash": content_hash,
+            "embedding": Vector(embedding),
+            "chunkIndex": global_idx
+        })
+    batch_obj.commit()
+
+def delete_chunks(doc_ids: list[str]) -> int:
+    for i in range(0, len(doc_ids), WRITE_BATCH_OPS):
+        batch_obj = db.batch()
+        for doc_id in doc_ids[i:i + WRITE_BATCH_OPS]:
+            batch_obj.delete(db.collection("scripture_chunks").document(doc_id))
+        batch_obj.commit()
+    return len(doc_ids)
 
 
 # ─── Ingestion Pipeline ──────────────────────────────────────────
-async def ingest(filepath: str, title: str, language: str, description: str = ""):
-    """Full ingestion pipeline: read → chunk → embed → upload to Firestore."""
+async def ingest(filepath: str, title: str, language: str, description: str = "", author: str = "",
+                 embed_workers: int = EMBED_WORKERS, embed_batch_size: int = EMBED_BATCH_SIZE,
+                 write_concurrency: int = WRITE_CONCURRENCY, scripture_id: str = None):
+    """Streaming ingestion pipeline: page iterator → incremental splitter → embedding batches → Firestore.
+
+    With `scripture_id`, updates that scripture in place: only new or changed chunks are
+    embedded and written, and chunks no longer in the source are deleted.
+    """
     start = time.time()
+    update_mode = scripture_id is not None
+
+    if not Path(filepath).exists():
+        print(f"ERROR: File not found: {filepath}")
+        sys.exit(1)
+
+    storage_path = f"scriptures/{Path(filepath).name}"
+    if update_mode:
+        scripture_ref = db.collection("scriptures").document(scripture_id)
+        current = scripture_ref.get()
+        if not current.exists:
+            print(f"ERROR: Scripture '{scripture_id}' not found in Firestore.")
+            sys.exit(1)
+        current = current.to_dict()
+        title = title or current.get("title", "")
+        language = language or current.get("language", "")
+        author = author or current.get("author", "")
+        description = description or current.get("description", "")
 
     print(f"\n{'='*60}")
-    print(f"  INGESTING: {title}")
+    print(f"  {'UPDATING' if update_mode else 'INGESTING'}: {title}")
     print(f"  File: {filepath}")
     print(f"  Language: {language}")
     print(f"{'='*60}\n")
 
-    # 1. Read file
-    print("Step 1/6: Reading file...")
-    text = read_file(filepath)
-
-    # 2. Chunk
-    print("Step 2/6: Chunking text...")
-    splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100)
-    chunks = splitter.split_text(text)
-    print(f"  ✂️  Split into {len(chunks)} chunks")
-
-    # 3. Create scripture document
-    print("Step 3/6: Creating scripture document in Firestore...")
-    scripture_ref = db.collection("scriptures").document()
-    scripture_id = scripture_ref.id
-    storage_path = f"scriptures/{Path(filepath).name}"
-
-    scripture_ref.set({
+    # 1. Create (or refresh) scripture document
+    print("Step 1/4: Writing scripture document in Firestore...")
+    fields = {
         "title": title,
         "language": language,
         "author": author,
         "description": description,
-        "vectorized": False,
         "storagePath": storage_path,
         "localFilePath": str(Path(filepath).resolve()),  # absolute path for local serving
-        "addedAt": datetime.now(timezone.utc),
-        "chunkCount": len(chunks)
-    })
+    }
+    existing = {}
+    if update_mode:
+        scripture_ref.update(fields)
+        existing = load_existing_chunks(scripture_id)
+        print(f"  🔎 Found {sum(len(v) for v in existing.values())} existing chunks")
+    else:
+        scripture_ref = db.collection("scriptures").document()
+        scripture_id = scripture_ref.id
+        scripture_ref.set({
+            **fields,
+            "vectorized": False,
+            "addedAt": datetime.now(timezone.utc),
+            "chunkCount": 0
+        })
     print(f"  📝 Scripture ID: {scripture_id}")
 
-    # 4. Upload file to Firebase Storage
-    print("Step 4/6: Uploading file to Firebase Storage...")
+    # 2. Upload file to Firebase Storage
+    print("Step 2/4: Uploading file to Firebase Storage...")
     try:
         bucket = storage.bucket()
         blob = bucket.blob(storage_path)
@@ -134,53 +463,24 @@ async def ingest(filepath: str, title: str, language: str, description: str = ""
     except Exception as e:
         print(f"  ⚠️  Storage upload failed (non-fatal): {e}")
 
-    # 5. Embed and write chunks
-    print(f"Step 5/6: Embedding and uploading {len(chunks)} chunks...")
-    batch_obj = db.batch()
-    op_count = 0
-    total_written = 0
-
-    for i in range(0, len(chunks), EMBED_BATCH_SIZE):
-        chunk_batch = chunks[i:i + EMBED_BATCH_SIZE]
-        embeddings = await embed_batch(chunk_batch)
-
-        for j, embedding in enumerate(embeddings):
-            if op_count >= 490:
-                batch_obj.commit()
-                batch_obj = db.batch()
-                op_count = 0
-
-            global_idx = i + j
-            chunk_id = f"{scripture_id}_chunk_{global_idx}"
-            chunk_ref = db.collection("scripture_chunks").document(chunk_id)
-
-            batch_obj.set(chunk_ref, {
-                "scriptureId": scripture_id,
-                "text": chunk_batch[j],
-                "embedding": Vector(embedding),
-                "chunkIndex": global_idx,
-                "metadata": {
-                    "title": title,
-                    "language": language,
-                    "author": author
-                }
-            })
-            op_count += 1
-            total_written += 1
-
-        pct = min(100, int((i + EMBED_BATCH_SIZE) / len(chunks) * 100))
-        print(f"  📊 Progress: {pct}% ({total_written}/{len(chunks)} chunks)")
-
-    if op_count > 0:
-        batch_obj.commit()
+    # 3. Read → chunk → embed → write, as concurrent stages with bounded queues between them
+    print("Step 3/4: Extracting, chunking, embedding and uploading...")
+    counts = await run_pipeline(filepath, scripture_id, embed_workers, embed_batch_size,
+                                write_concurrency, existing=existing)
+    deleted = delete_chunks(counts["stale"])
 
-    # 6. Mark vectorized
-    print("Step 6/6: Marking scripture as vectorized...")
-    scripture_ref.update({"vectorized": True})
+    # 4. Mark vectorized
+    print("Step 4/4: Marking scripture as vectorized...")
+    scripture_ref.update({"vectorized": True, "chunkCount": counts["total"]})
 
     elapsed = time.time() - start
     print(f"\n{'='*60}")
-    print(f"  ✅ SUCCESS: {total_written} chunks embedded and uploaded")
+    print(f"  ✅ SUCCESS: {counts['total']} chunks in scripture")
+    print(f"  ⏭️  Skipped (unchanged): {counts['skipped']}")
+    print(f"  🔀 Re-indexed only:      {counts['reindexed']}")
+    print(f"  💾 From embedding cache: {counts['cache_hits']}")
+    print(f"  🧠 Newly embedded:       {counts['embedded']}")
+    print(f"  🗑️  Deleted (removed):    {deleted}")
     print(f"  ⏱️  Time: {elapsed:.1f}s")
     print(f"  🆔 Scripture ID: {scripture_id}")
     print(f"{'='*60}\n")
@@ -216,6 +516,31 @@ def wipe():
     print("  ✅ All scriptures reset.\n")
 
 
+def strip_chunk_metadata(dry_run: bool = False):
+    """One-off migration: remove the denormalized `metadata` map from every chunk.
+
+    Safe to re-run; chunks without the field are skipped.
+    """
+    print("\nStripping denormalized metadata from scripture_chunks...")
+    chunks = db.collection("scripture_chunks").select(["metadata"]).stream()
+    writer = None if dry_run else db.bulk_writer()
+    scanned = 0
+    stripped = 0
+    for doc in chunks:
+        scanned += 1
+        if "metadata" not in (doc.to_dict() or {}):
+            continue
+        stripped += 1
+        if writer is not None:
+            writer.update(doc.reference, {"metadata": firestore.DELETE_FIELD})
+        if stripped % 1000 == 0:
+            print(f"  Stripped {stripped} of {scanned} chunks so far...")
+    if writer is not None:
+        writer.close()
+    action = "Would strip" if dry_run else "Stripped"
+    print(f"  ✅ {action} metadata from {stripped} of {scanned} chunks.\n")
+
+
 # ─── Approve Command ────────────────────────────────────────────
 async def approve_request(request_id: str):
     """Approve a user's scripture request and run ingestion."""
@@ -268,36 +593,54 @@ async def approve_request(request_id: str):
 
 # ─── CLI ──────────────────────────────────────────────────────────
 def main():
+    global EMBED_BACKEND
     parser = argparse.ArgumentParser(
         description="SanatanaGPT Admin Ingestion CLI",
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
 Examples:
   python ingest.py --file "gita.pdf" --title "Bhagavad Gita" --language "Sanskrit"
+  python ingest.py --file "gita_v2.pdf" --update <scripture_id>
   python ingest.py --wipe
   python ingest.py --approve abc123
+  python ingest.py --strip-chunk-metadata --dry-run
         """
     )
 
     parser.add_argument("--file", type=str, help="Path to PDF or TXT file to ingest")
     parser.add_argument("--title", type=str, help="Scripture title")
-    parser.add_argument("--language", type=str, default="English", help="Language (default: English)")
+    parser.add_argument("--language", type=str, default=None, help="Language (default: English, or unchanged with --update)")
     parser.add_argument("--author", type=str, default="", help="Optional Author")
     parser.add_argument("--description", type=str, default="", help="Optional description")
+    parser.add_argument("--update", type=str, metavar="SCRIPTURE_ID", help="Re-ingest --file into an existing scripture, rewriting only changed chunks")
+    parser.add_argument("--embed-workers", type=int, default=EMBED_WORKERS, help="Embedding worker processes (default: 0 = in-process)")
+    parser.add_argument("--embed-batch-size", type=int, default=EMBED_BATCH_SIZE, help=f"Chunks per embedding batch (default: {EMBED_BATCH_SIZE})")
+    parser.add_argument("--embed-backend", type=str, default=EMBED_BACKEND,
+                        choices=["torch", "torch-int8", "onnx", "onnx-int8"],
+                        help="Encoder backend; use the same one as the API's EMBED_BACKEND (default: torch)")
+    parser.add_argument("--write-concurrency", type=int, default=WRITE_CONCURRENCY, help=f"Concurrent Firestore batch commits (default: {WRITE_CONCURRENCY})")
     parser.add_argument("--wipe", action="store_true", help="Wipe all chunks and reset scriptures")
     parser.add_argument("--approve", type=str, metavar="REQUEST_ID", help="Approve a pending scripture request")
+    parser.add_argument("--strip-chunk-metadata", action="store_true", help="Migration: remove the per-chunk copy of scripture metadata")
+    parser.add_argument("--dry-run", action="store_true", help="With --strip-chunk-metadata, only count affected chunks")
 
     args = parser.parse_args()
+    EMBED_BACKEND = args.embed_backend
 
     if args.wipe:
         wipe()
     elif args.approve:
         asyncio.run(approve_request(args.approve))
+    elif args.strip_chunk_metadata:
+        strip_chunk_metadata(dry_run=args.dry_run)
     elif args.file:
-        if not args.title:
+        if not args.title and not args.update:
             print("ERROR: --title is required when using --file")
             sys.exit(1)
-        asyncio.run(ingest(args.file, args.title, args.language, args.description, args.author))
+        language = args.language or ("" if args.update else "English")
+        asyncio.run(ingest(args.file, args.title, language, args.description, args.author,
+                           embed_workers=args.embed_workers, embed_batch_size=args.embed_batch_size,
+                           write_concurrency=args.write_concurrency, scripture_id=args.update))
     else:
         parser.print_help()
 
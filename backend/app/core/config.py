@@ -7,6 +7,84 @@ class Settings(BaseSettings):
     GROQ_API_KEY: str = ""
     FIREBASE_STORAGE_BUCKET: str = ""
     ADMIN_UID: str = ""
+    # Serve RAG retrieval from an in-process copy of scripture_chunks
+    LOCAL_VECTOR_INDEX: bool = False
+    VECTOR_INDEX_QUANTIZATION: str = "none"  # none | float16 | int8
+    VECTOR_INDEX_RERANK_FACTOR: int = 10     # exact re-rank over top limit*factor candidates
+    VECTOR_INDEX_DIR: str = ""               # memmap dir for full-precision rows (default: temp dir)
+    # Hybrid BM25 + vector retrieval
+    HYBRID_SEARCH: bool = False
+    LEXICAL_INDEX_PATH: str = "lexical_index.npz"
+    LEXICAL_INDEX_REBUILD_SECONDS: float = 30  # at most one in-memory rebuild per interval while chunks change
+    LEXICAL_INDEX_REFRESH_SECONDS: float = 3600  # projected re-read interval when LOCAL_VECTOR_INDEX is off
+    LEXICAL_BUDGET_MS: float = 5.0
+    LEXICAL_MATCH_SCORE: float = 6.0  # BM25 score that counts as a match without the vector
+    # Cross-encoder re-ranking
+    RERANK_ENABLED: bool = False
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_CANDIDATES: int = 30
+    RERANK_KEEP: int = 3
+    RERANK_BUDGET_MS: float = 150.0
+    RERANK_MIN_SCORE: float = 0.0  # cross-encoder logit; below this a chunk is not a match
+    RERANK_MAX_PAIRS: int = 256    # query/text pairs per shared forward pass
+    # Query encoder backend: torch | torch-int8 | onnx | onnx-int8
+    EMBED_BACKEND: str = "torch"
+    EMBED_ONNX_INT8_FILE: str = "onnx/model_qint8_avx512_vnni.onnx"
+    # Startup parity check loads a second (torch) model: off by default, since it doubles
+    # peak memory. `python -m app.services.embedding` runs it offline / in CI instead.
+    EMBED_PARITY_CHECK: bool = False
+    EMBED_PARITY_TOLERANCE: float = 0.99  # min cosine vs the PyTorch vectors
+    # Query embedding micro-batching
+    EMBED_MAX_BATCH_SIZE: int = 32
+    EMBED_MAX_WAIT_MS: float = 5.0
+    # Query embedding LRU cache
+    EMBED_CACHE_SIZE: int = 2048
+    EMBED_CACHE_TTL_SECONDS: float = 3600
+    # Semantic answer cache for history-free questions
+    ANSWER_CACHE_ENABLED: bool = False
+    ANSWER_CACHE_SIZE: int = 512
+    ANSWER_CACHE_THRESHOLD: float = 0.95  # cosine similarity between questions
+    ANSWER_CACHE_TTL_SECONDS: float = 86400
+    # LLM provider router
+    LLM_MAX_RETRIES: int = 3
+    LLM_MAX_BACKOFF_SECONDS: float = 4.0
+    LLM_BREAKER_ERROR_RATE: float = 0.5
+    LLM_BREAKER_LATENCY_SECONDS: float = 20.0
+    LLM_BREAKER_COOLDOWN_SECONDS: float = 30.0
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_PERCENTILE: float = 0.95
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = 2.0
+    # Provider request quotas (requests/minute, 0 = unlimited) — defaults match the free tiers
+    GROQ_REQUESTS_PER_MINUTE: float = 30
+    GEMINI_REQUESTS_PER_MINUTE: float = 10
+    LLM_QUOTA_MAX_WAIT_SECONDS: float = 5.0
+    # Chat admission control
+    CHAT_MAX_IN_FLIGHT: int = 32
+    CHAT_MAX_PER_USER: int = 2
+    CHAT_MAX_QUEUE: int = 64  # hard cap on waiters; the deadline below usually binds first
+    CHAT_QUEUE_TIMEOUT_SECONDS: float = 5.0  # max wait, also used to refuse requests expected to miss it
+    # Batch question endpoint
+    CHAT_BATCH_MAX_QUESTIONS: int = 50
+    CHAT_BATCH_LLM_CONCURRENCY: int = 4
+    # Prompt assembly
+    PROMPT_TOKEN_BUDGET: int = 3000
+    PROMPT_HISTORY_SHARE: float = 0.3
+    PROMPT_ROLLING_SUMMARY: bool = False
+    PROMPT_SUMMARY_SHARE: float = 0.4   # of the history budget, reserved for the rolling summary
+    # Scripture catalog cache (GET /api/scriptures/, /api/admin/scriptures)
+    CATALOG_CACHE_TTL_SECONDS: float = 300
+    # Background conversation deletion
+    DELETE_PAGE_SIZE: int = 500
+    DELETE_MAX_ATTEMPTS: int = 5   # startup resumes per job before it is marked abandoned
+    # Scripture download disk cache ("" = <tmp>/scripture_cache)
+    DOWNLOAD_CACHE_DIR: str = ""
+    DOWNLOAD_CACHE_MAX_BYTES: int = 2 * 1024 ** 3
+    DOWNLOAD_CACHE_REVALIDATE_SECONDS: float = 300
+    # Verified ID-token cache
+    AUTH_TOKEN_CACHE_SIZE: int = 4096
+    AUTH_CERT_REFRESH_SECONDS: float = 60
+    # Structured JSON logs on stdout (DEBUG adds per-stage timings)
+    LOG_LEVEL: str = "INFO"
 
     model_config = SettingsConfigDict(
         env_file=".env",
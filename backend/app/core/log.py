@@ -0,0 +1,47 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from app.core.config import settings
+
+# Records are handed to a queue on the calling thread and written to stdout by a
+# listener thread, so logging never blocks the event loop on I/O.
+_queue = queue.SimpleQueue()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, event, plus the event's fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def _setup() -> logging.Logger:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(_queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger = logging.getLogger("sanatanagpt")
+    logger.setLevel(settings.LOG_LEVEL.upper())
+    logger.addHandler(logging.handlers.QueueHandler(_queue))
+    logger.propagate = False
+    return logger
+
+
+logger = _setup()
+
+
+def log_event(event: str, level: int = logging.INFO, **fields):
+    """Structured, non-blocking log line, e.g. log_event("llm.response", provider="groq", seconds=1.2)."""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
@@ -1,21 +1,92 @@
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.routes import chat, scriptures, requests, users, admin
 from app.core.config import settings
-import firebase_admin
-from firebase_admin import credentials
-import os
-import json
+from app.core.log import log_event
 
 from app.core.firebase import init_firebase
 
 # Initialize Firebase before routing starts
 init_firebase()
 
+# Heavy SDKs (sentence-transformers, groq, genai, storage) are imported lazily where used
+log_event("startup.imported", seconds=round(time.perf_counter() - _import_started, 2))
+
+# Readiness is tracked separately from liveness: /health answers as soon as the
+# process is up, /ready only once the model is warm and the index (if any) is loaded.
+readiness = {"embedding_model": False}
+if settings.RERANK_ENABLED:
+    readiness["reranker"] = False
+
+async def warm_up():
+    """Load the embedding model and run one encode so the first chat request doesn't pay for it."""
+    from app.services.embedding import get_embedding_model
+    started = time.perf_counter()
+    try:
+        model = await asyncio.to_thread(get_embedding_model)
+        await asyncio.to_thread(model.encode, "warm-up")
+        readiness["embedding_model"] = True
+        log_event("startup.warm", component="embedding_model", seconds=round(time.perf_counter() - started, 2))
+    except Exception as e:
+        log_event("startup.warm_failed", logging.ERROR, component="embedding_model", error=str(e))
+
+    if settings.RERANK_ENABLED:
+        from app.services.rerank import get_reranker
+        started = time.perf_counter()
+        try:
+            reranker = await asyncio.to_thread(get_reranker)
+            await asyncio.to_thread(reranker.predict, [("warm-up", "warm-up")])
+            readiness["reranker"] = True
+            log_event("startup.warm", component="reranker", seconds=round(time.perf_counter() - started, 2))
+        except Exception as e:
+            log_event("startup.warm_failed", logging.ERROR, component="reranker", error=str(e))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up_task = asyncio.create_task(warm_up())
+    index = None
+    if settings.LOCAL_VECTOR_INDEX:
+        from app.db.firestore import get_db
+        from app.services.vector_index import get_vector_index
+        index = get_vector_index()
+        index.start(get_db())
+    lexical = None
+    if settings.HYBRID_SEARCH:
+        from app.db.firestore import get_db
+        from app.services.lexical import get_lexical_retriever
+        lexical = get_lexical_retriever()
+        lexical.start(get_db(), vector_index=index)
+    from app.middleware.auth import cert_refresher
+    cert_refresher.start()
+    from app.db.firestore import get_db
+    from app.services.deletion import resume_conversation_deletions
+    resume_task = asyncio.create_task(asyncio.to_thread(resume_conversation_deletions, get_db()))
+    yield
+    resume_task.cancel()
+    cert_refresher.stop()
+    warm_up_task.cancel()
+    if lexical is not None:
+        lexical.stop()
+    if index is not None:
+        index.stop()
+    from app.services.embedding import close_embedding_batcher
+    await close_embedding_batcher()
+    if settings.RERANK_ENABLED:
+        from app.services.rerank import close_rerank_batcher
+        await close_rerank_batcher()
+
 app = FastAPI(
     title="SanatanaGPT API",
     description="Backend API for the SanatanaGPT Revamp",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -45,3 +116,50 @@ def read_root():
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
+
+@app.get("/ready")
+def readiness_check():
+    """Readiness probe — 503 until the model is warm and the local index (if enabled) is loaded."""
+    checks = dict(readiness)
+    if settings.LOCAL_VECTOR_INDEX:
+        from app.services.vector_index import get_vector_index
+        checks["vector_index"] = get_vector_index().ready.is_set()
+    ready = all(checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "starting", "checks": checks},
+    )
+
+def collect_stats() -> dict:
+    from app.services.embedding import get_embedding_cache, get_embedding_batcher
+    from app.services.answer_cache import get_answer_cache
+    from app.services.catalog import get_scripture_catalog
+    from app.services.blob_cache import get_blob_cache
+    from app.middleware.auth import token_cache
+    from app.services.admission import get_admission_controller
+    from app.services.llm import get_llm_router
+    from app.services.vector_index import get_vector_index
+    from app.services.rerank import get_rerank_batcher
+    return {
+        "embedding_cache": get_embedding_cache().stats(),
+        "embedding_batcher": get_embedding_batcher().stats(),
+        "rerank_batcher": get_rerank_batcher().stats() if settings.RERANK_ENABLED else None,
+        "answer_cache": get_answer_cache().stats(),
+        "scripture_catalog": get_scripture_catalog().stats(),
+        "download_cache": get_blob_cache().stats(),
+        "auth_tokens": token_cache.stats(),
+        "chat_admission": get_admission_controller().stats(),
+        "llm_providers": get_llm_router().stats(),
+        "vector_index": get_vector_index().stats() if settings.LOCAL_VECTOR_INDEX else None,
+    }
+
+@app.get("/stats")
+def cache_stats():
+    """Hit/miss counters for the in-process caches."""
+    return collect_stats()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: per-stage and LLM latency histograms plus component gauges."""
+    from app.services.metrics import render_metrics
+    return PlainTextResponse(render_metrics(collect_stats()), media_type="text/plain; version=0.0.4")
@@ -1,4 +1,8 @@
 import os
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import firebase_admin
@@ -12,14 +16,131 @@ init_firebase()
 
 security = HTTPBearer()
 
+
+class TokenCache:
+    """Bounded LRU of verified ID tokens, keyed by SHA-256 of the token.
+
+    A decoded token is reused until its `exp`; revocation isn't checked on the
+    uncached path either, so a hit is exactly as trustworthy as re-verifying.
+    """
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self._entries = OrderedDict()   # token hash -> (decoded claims, exp)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=200)  # seconds per uncached verification
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str):
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, decoded: dict):
+        exp = decoded.get("exp")
+        if not exp:
+            return
+        key = self.key(token)
+        with self._lock:
+            self._entries[key] = (decoded, float(exp))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def record_verification(self, seconds: float, ok: bool):
+        with self._lock:
+            self._latencies.append(seconds)
+            if not ok:
+                self.failures += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            latencies = sorted(self._latencies)
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "failures": self.failures,
+                "hit_rate": self.hits / total if total else 0.0,
+                "verify_p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else None,
+                "verify_p95_ms": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000 if latencies else None,
+            }
+
+
+token_cache = TokenCache(max_size=settings.AUTH_TOKEN_CACHE_SIZE)
+
+
+def refresh_certificates():
+    """Fetch Google's ID-token signing certs through the SDK's own cache-control session.
+
+    While the cached copy is fresh this costs nothing; once it expires, this call (not a
+    user request) pays for the download.
+    """
+    from firebase_admin._token_gen import ID_TOKEN_CERT_URI
+    verifier = auth._get_client(firebase_admin.get_app())._token_verifier
+    verifier.request(ID_TOKEN_CERT_URI)
+
+
+class CertificateRefresher:
+    """Background thread that keeps the signing certificates warm."""
+
+    def __init__(self, interval_seconds: float):
+        self.interval = interval_seconds
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                refresh_certificates()
+            except Exception as e:
+                print(f"[Auth] Certificate refresh failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="auth-cert-refresh")
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+cert_refresher = CertificateRefresher(settings.AUTH_CERT_REFRESH_SECONDS)
+
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
+    decoded_token = token_cache.get(token)
+    if decoded_token is not None:
+        return decoded_token
+
+    started = time.perf_counter()
     try:
         decoded_token = auth.verify_id_token(token)
-        return decoded_token
     except Exception as e:
+        token_cache.record_verification(time.perf_counter() - started, ok=False)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token. Please sign in again.",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    token_cache.record_verification(time.perf_counter() - started, ok=True)
+    token_cache.put(token, decoded_token)
+    return decoded_token
@@ -1,26 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request
 from app.middleware.auth import get_current_user
 from app.core.config import settings
 from app.db.firestore import get_db
+from app.services.answer_cache import invalidate_scripture_answers
+from app.services.catalog import get_scripture_catalog, invalidate_catalog, etag_response
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
 
 @router.get("/scriptures")
-async def list_scriptures(user: dict = Depends(get_current_user)):
+async def list_scriptures(request: Request, user: dict = Depends(get_current_user)):
     """List all scriptures (admin only)."""
     if user.get("uid") != settings.ADMIN_UID or not settings.ADMIN_UID:
         raise HTTPException(status_code=403, detail="Admin access required")
 
-    db = get_db()
-    docs = db.collection("scriptures").stream()
-    scriptures = []
-    for doc in docs:
-        data = doc.to_dict()
-        data["id"] = doc.id
-        scriptures.append(data)
-
-    return {"scriptures": scriptures}
+    body, etag = await asyncio.to_thread(get_scripture_catalog().get, get_db(), "admin")
+    return etag_response(request, body, etag, cache_control="private, no-cache")
 
 
 @router.delete("/scriptures/{scripture_id}")
@@ -53,5 +49,7 @@ async def delete_scripture(scripture_id: str, user: dict = Depends(get_current_u
     # Delete the scripture document itself
     batch.delete(scripture_ref)
     batch.commit()
+    invalidate_catalog()
+    invalidate_scripture_answers(scripture_id)
 
     return {"status": "deleted", "deletedChunks": count}
@@ -1,18 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from app.middleware.auth import get_current_user
 from app.db.firestore import get_db, utc_now
-from google import genai
-import os
+import json
+import base64
+import time
 import asyncio
+import logging
+import weakref
+from datetime import datetime
 from google.cloud.firestore_v1.vector import Vector
 from google.cloud.firestore_v1.base_vector_query import DistanceMeasure
+from google.cloud.firestore_v1.field_path import FieldPath
 from firebase_admin import firestore
 from app.core.config import settings
-
-if settings.GEMINI_API_KEY:
-    os.environ["GEMINI_API_KEY"] = settings.GEMINI_API_KEY
+from app.services.prompt import build_prompts, assemble_prompt, build_summary_prompt
+from app.services.metrics import span, REQUEST_SECONDS
+from app.core.log import log_event
 
 router = APIRouter(prefix="/api", tags=["chat_and_conversations"])
 
@@ -22,19 +28,80 @@ class ChatMessage(BaseModel):
 class RenameConversationRequest(BaseModel):
     title: str
 
+CONVERSATION_FIELDS = ["title", "updatedAt", "deleting"]
+MESSAGE_FIELDS = ["role", "content", "sources", "has_scripture_match", "timestamp"]
+
+def encode_cursor(timestamp, doc_id: str) -> str:
+    """Opaque page cursor: the last row's sort timestamp plus its doc id as a tie-breaker."""
+    raw = json.dumps({"t": timestamp.isoformat(), "id": doc_id})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return datetime.fromisoformat(data["t"]), data["id"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def fetch_page(col_ref, order_field: str, fields: list[str], limit: int, cursor: Optional[str]):
+    """One page of `col_ref`, newest first by `order_field` then doc id, projected to `fields`.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    query = col_ref.select(fields) \
+        .order_by(order_field, direction=firestore.Query.DESCENDING) \
+        .order_by(FieldPath.document_id(), direction=firestore.Query.DESCENDING)
+    if cursor:
+        timestamp, doc_id = decode_cursor(cursor)
+        query = query.start_after({order_field: timestamp, FieldPath.document_id(): col_ref.document(doc_id)})
+
+    # One extra row tells us whether another page exists without a second query
+    docs = list(query.limit(limit + 1).stream())
+    rows = []
+    for doc in docs[:limit]:
+        data = doc.to_dict()
+        data["id"] = doc.id
+        rows.append(data)
+    next_cursor = None
+    if len(docs) > limit and rows and rows[-1].get(order_field):
+        next_cursor = encode_cursor(rows[-1][order_field], rows[-1]["id"])
+    return rows, next_cursor
+
 @router.get("/conversations")
-async def get_conversations(user: dict = Depends(get_current_user)):
+async def get_conversations(
+    limit: int = Query(30, ge=1, le=100),
+    startAfter: Optional[str] = None,
+    user: dict = Depends(get_current_user),
+):
+    """Conversations for the sidebar, most recently updated first, `limit` per page.
+
+    Pass the returned `nextCursor` as `startAfter` to load the next page.
+    """
     db = get_db()
     uid = user.get("uid")
-    docs = db.collection("users").document(uid).collection("conversations").order_by("updatedAt", direction=firestore.Query.DESCENDING).stream()
-    
-    convs = []
-    for doc in docs:
-        data = doc.to_dict()
-        data["id"] = doc.id
-        convs.append(data)
-        
-    return {"conversations": convs}
+    convs_ref = db.collection("users").document(uid).collection("conversations")
+    convs, next_cursor = await asyncio.to_thread(fetch_page, convs_ref, "updatedAt", CONVERSATION_FIELDS, limit, startAfter)
+    # Conversations mid-deletion are already gone as far as the user is concerned
+    convs = [{k: v for k, v in c.items() if k != "deleting"} for c in convs if not c.get("deleting")]
+    return {"conversations": convs, "nextCursor": next_cursor}
+
+@router.get("/conversations/{convId}/messages")
+async def get_messages(
+    convId: str,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    user: dict = Depends(get_current_user),
+):
+    """A page of messages, oldest first within the page, ending at the newest (or at `before`).
+
+    Pass the returned `nextCursor` as `before` to load older messages.
+    """
+    db = get_db()
+    uid = user.get("uid")
+    messages_ref = db.collection("users").document(uid).collection("conversations").document(convId).collection("messages")
+    messages, next_cursor = await asyncio.to_thread(fetch_page, messages_ref, "timestamp", MESSAGE_FIELDS, limit, before)
+    return {"messages": messages[::-1], "nextCursor": next_cursor}
 
 @router.post("/conversations")
 async def create_conversation(user: dict = Depends(get_current_user)):
@@ -74,27 +141,22 @@ async def rename_conversation(convId: str, payload: RenameConversationRequest, u
     
     return {"status": "success", "title": new_title}
 
-@router.delete("/conversations/{convId}")
-async def delete_conversation(convId: str, user: dict = Depends(get_current_user)):
+@router.delete("/conversations/{convId}", status_code=202)
+async def delete_conversation(convId: str, background_tasks: BackgroundTasks, user: dict = Depends(get_current_user)):
+    """Hide the conversation now; its messages are deleted by a background job."""
+    from app.services.deletion import start_conversation_deletion, delete_conversation_job
     db = get_db()
     uid = user.get("uid")
     conv_ref = db.collection("users").document(uid).collection("conversations").document(convId)
     
-    doc = conv_ref.get()
+    doc = await asyncio.to_thread(conv_ref.get)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Conversation not found")
         
-    messages_ref = conv_ref.collection("messages").limit(100).stream()
-    batch = db.batch()
-    msg_count = 0
-    for msg in messages_ref:
-        batch.delete(msg.reference)
-        msg_count += 1
-    
-    batch.delete(conv_ref)
-    batch.commit()
+    await asyncio.to_thread(start_conversation_deletion, db, uid, convId)
+    background_tasks.add_task(delete_conversation_job, db, uid, convId)
     
-    return {"status": "deleted", "deleted_messages": msg_count}
+    return {"status": "deleting", "convId": convId}
 
 async def background_generate_title(uid: str, convId: str, db, first_message: str):
     """Generate a short, smart title using Groq, then save it to Firestore."""
@@ -102,28 +164,23 @@ async def background_generate_title(uid: str, convId: str, db, first_message: st
     
     if settings.GROQ_API_KEY:
         try:
-            from groq import AsyncGroq
-            groq_client = AsyncGroq(api_key=settings.GROQ_API_KEY)
-            resp = await groq_client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are a chat title generator. Create a concise title of "
-                            "3 to 4 words MAXIMUM for a conversation based on the user's question. "
-                            "Respond with ONLY the title. No quotes, no punctuation, no explanation."
-                        )
-                    },
-                    {"role": "user", "content": first_message}
-                ],
-                model="llama-3.3-70b-versatile",
+            from app.services.llm import get_llm_router
+            title = await get_llm_router().complete(
+                (
+                    "You are a chat title generator. Create a concise title of "
+                    "3 to 4 words MAXIMUM for a conversation based on the user's question. "
+                    "Respond with ONLY the title. No quotes, no punctuation, no explanation."
+                ),
+                first_message,
                 temperature=0.5,
                 max_tokens=20,
+                providers=["groq"],
+                hedge=False,
             )
-            title = resp.choices[0].message.content.strip()
-            print(f"[Title] Generated: '{title}'")
+            title = title.strip()
+            log_event("title.generated", title=title)
         except Exception as e:
-            print(f"[Title] Groq failed, using fallback: {e}")
+            log_event("title.failed", logging.WARNING, error=str(e))
     
     # Fallback: clean word-truncation
     if not title:
@@ -134,206 +191,567 @@ async def background_generate_title(uid: str, convId: str, db, first_message: st
     conv_ref.update({"title": title, "updatedAt": utc_now()})
 
 
+_summary_locks = weakref.WeakValueDictionary()   # conversation path -> asyncio.Lock
+
+@firestore.transactional
+def commit_summary(transaction, conv_ref, expected_through, summary: str, through) -> bool:
+    """Write the new summary only if no other instance folded turns since it was read."""
+    snapshot = conv_ref.get(transaction=transaction)
+    if (snapshot.to_dict() or {}).get("summarizedThrough") != expected_through:
+        return False
+    transaction.update(conv_ref, {"summary": summary, "summarizedThrough": through})
+    return True
+
+async def background_update_summary(db, conv_ref, dropped: list[dict]):
+    """Fold turns that fell out of the history window into the conversation's rolling summary.
+
+    Updates for one conversation run one at a time and start from the stored summary,
+    skipping turns already folded (`summarizedThrough`), so overlapping turns neither
+    re-fold nor overwrite each other's work.
+    """
+    lock = _summary_locks.get(conv_ref.path)
+    if lock is None:
+        lock = _summary_locks[conv_ref.path] = asyncio.Lock()
+    async with lock:
+        try:
+            snapshot = await asyncio.to_thread(conv_ref.get)
+            data = snapshot.to_dict() or {}
+            through = data.get("summarizedThrough")
+            fresh = [m for m in dropped if through is None or m.get("timestamp") > through]
+            if not fresh:
+                return
+            from app.services.llm import get_llm_router
+            system_prompt, user_prompt = build_summary_prompt(data.get("summary", ""), fresh)
+            summary = await get_llm_router().complete(system_prompt, user_prompt, temperature=0.2, max_tokens=256, hedge=False)
+            committed = await asyncio.to_thread(
+                commit_summary, db.transaction(), conv_ref, through, summary.strip(), fresh[-1]["timestamp"]
+            )
+            if not committed:
+                log_event("summary.conflict", conversation=conv_ref.id)
+        except Exception as e:
+            log_event("summary.failed", logging.ERROR, conversation=conv_ref.id, error=str(e))
+
+
 async def generate_ai_response(input_text: str, context_str: str, history: str, has_context: bool) -> str:
-    """Call LLM and return full text response. Uses Groq (primary) with Gemini (fallback)."""
-    
-    system_prompt = "You are SanatanaGPT, an AI assistant and scholarly guide on Hindu scriptures. Structure your answers beautifully using rich Markdown."
-    
-    if has_context:
-        user_prompt = f"""Below is some scripture context that MAY OR MAY NOT be relevant.
-<context>
-{context_str}
-</context>
+    """Call LLM and return full text response. Uses Groq (primary) with Gemini (fallback) via the provider router."""
+    from app.services.llm import get_llm_router
+    system_prompt, user_prompt = build_prompts(input_text, context_str, history, has_context)
+    return await get_llm_router().complete(system_prompt, user_prompt, temperature=0.7, max_tokens=4096)
 
-Instructions:
-1. If the <context> provides the answer or helpful information, use it and cite the text properly (e.g., *(Bhagavad Gita)*).
-2. If the <context> DOES NOT contain the answer (for example, if the user asks about geography, general knowledge, or random facts), you MUST IGNORE the context entirely and use your general knowledge.
-3. ABSOLUTE RULE: If you use your general knowledge, DO NOT apologize. DO NOT mention the scripture. DO NOT say "The provided context does not contain..." or anything similar. Pretend you never received the <context> at all. Just give the answer directly.
+async def stream_ai_response(input_text: str, context_str: str, history: str, has_context: bool):
+    """Yield response text as the LLM streams it. Same Groq → Gemini failover as generate_ai_response.
 
-Conversation history:
-{history}
+    Retries and failover only happen before the first token has been sent; once text
+    has reached the client a mid-stream failure is surfaced as an error instead.
+    """
+    from app.services.llm import get_llm_router
+    system_prompt, user_prompt = build_prompts(input_text, context_str, history, has_context)
+    async for delta in get_llm_router().stream(system_prompt, user_prompt, temperature=0.7, max_tokens=4096):
+        yield delta
 
-User Question: {input_text}"""
-    else:
-        user_prompt = f"""The user asked a question for which no directly relevant scripture passages were found in the database.
+def ndjson_line(event: dict) -> str:
+    return json.dumps(event, ensure_ascii=False) + "\n"
 
-Provide a thoughtful answer from your general knowledge. Be clear and honest. Structure your answer beautifully using rich Markdown.
+def retrieve_chunks(db, query_vector: list, limit: int = 5) -> list[dict]:
+    """Top-k nearest scripture chunks, from the local index when it is loaded, else Firestore."""
+    if settings.LOCAL_VECTOR_INDEX:
+        from app.services.vector_index import get_vector_index
+        index = get_vector_index()
+        if index.ready.is_set():
+            return index.search(query_vector, limit=limit)
 
-Conversation history:
-{history}
+    results = db.collection("scripture_chunks").find_nearest(
+        vector_field="embedding",
+        query_vector=Vector(query_vector),
+        distance_measure=DistanceMeasure.COSINE,
+        limit=limit,
+        distance_result_field="vector_distance"
+    ).stream()
+    return [match.to_dict() for match in results]
 
-User: {input_text}"""
+def select_matches(results: list[dict], scripture_metadata: dict = None) -> list[dict]:
+    """Keep retrieved chunks that are close enough to count as a scripture match (best first).
 
-    # --- Provider 1: Groq (Primary) ---
-    if settings.GROQ_API_KEY:
+    Titles come from `scripture_metadata` (scriptureId → metadata, see the catalog cache);
+    a chunk's own `metadata` copy is only a fallback for chunks not yet migrated.
+    """
+    matches = []
+    MATCH_THRESHOLD = 0.85  # cosine distance 0=identical, 1=orthogonal. 0.85 allows broad conceptual relevance
+    scripture_metadata = scripture_metadata or {}
+
+    for data in results:
+        md = scripture_metadata.get(data.get("scriptureId")) or data.get("metadata") or {}
+        ch_title = md.get("title") or "Unknown Scripture"
+        distance = data.get("vector_distance", 1.0)
+        lexical_score = data.get("lexical_score", 0.0)
+
+        log_event("rag.chunk", logging.DEBUG, distance=round(distance, 4), bm25=round(lexical_score, 2), title=ch_title)
+
+        if "rerank_score" in data:
+            # The cross-encoder's relevance judgement supersedes the distance threshold
+            is_match = data["rerank_score"] >= settings.RERANK_MIN_SCORE
+        else:
+            # Exact-term hits (verse numbers, names) count even when the embedding misses them
+            is_match = distance < MATCH_THRESHOLD or lexical_score >= settings.LEXICAL_MATCH_SCORE
+
+        if is_match:
+            matches.append({
+                "title": ch_title,
+                "text": data.get("text", ""),
+                "scriptureId": data.get("scriptureId", ""),
+                "chunkIndex": data.get("chunkIndex", 0),
+                "distance": distance,
+            })
+    return matches
+
+def retrieval_limits() -> tuple[int, int]:
+    """(chunks to fetch per query, candidates kept after fusion) for the enabled stages.
+
+    Over-fetch when a later stage (fusion / re-rank) picks the final few.
+    """
+    if settings.RERANK_ENABLED:
+        return settings.RERANK_CANDIDATES, settings.RERANK_CANDIDATES
+    if settings.HYBRID_SEARCH:
+        return 10, 5
+    return 5, 5
+
+def start_lexical_search(text: str):
+    """Kick off the BM25 lookup for HYBRID_SEARCH; None when it is disabled."""
+    if not settings.HYBRID_SEARCH:
+        return None
+    from app.services.lexical import get_lexical_retriever
+    return asyncio.create_task(asyncio.to_thread(get_lexical_retriever().search, text, 20))
+
+def start_metadata_lookup(db):
+    from app.services.catalog import get_scripture_catalog
+    return asyncio.create_task(asyncio.to_thread(get_scripture_catalog().metadata, db))
+
+async def fuse_lexical(results: list[dict], lexical_task) -> list[dict]:
+    """Stage: fuse vector results with the BM25 lookup, if it arrives within its budget."""
+    if lexical_task is None:
+        return results
+    _, candidates = retrieval_limits()
+    try:
+        with span("lexical"):
+            lexical = await asyncio.wait_for(lexical_task, timeout=settings.LEXICAL_BUDGET_MS / 1000)
+        from app.services.lexical import reciprocal_rank_fusion
+        return reciprocal_rank_fusion([results, lexical], limit=candidates)
+    except asyncio.TimeoutError:
+        log_event("lexical.skipped", logging.WARNING, reason="budget", budget_ms=settings.LEXICAL_BUDGET_MS)
+    except Exception as e:
+        log_event("lexical.error", logging.ERROR, error=str(e))
+    return results
+
+async def resolve_matches(results: list[dict], metadata_task) -> list[dict]:
+    """Stage: join scripture metadata onto the top results and keep the matches."""
+    results = results[:5]
+    scripture_metadata = {}
+    try:
+        with span("scripture_metadata"):
+            scripture_metadata = await metadata_task
+            if any(r.get("scriptureId") not in scripture_metadata for r in results):
+                # Newly ingested scripture the cached catalog hasn't seen yet
+                from app.services.catalog import get_scripture_catalog
+                scripture_metadata = await asyncio.to_thread(
+                    get_scripture_catalog().metadata_for, get_db(), [r.get("scriptureId") for r in results]
+                )
+    except Exception as e:
+        log_event("catalog.error", logging.ERROR, error=str(e))
+    return select_matches(results, scripture_metadata)
+
+async def refine_results(text: str, results: list[dict], lexical_task, metadata_task) -> list[dict]:
+    """Stage: fuse with BM25, re-rank, join scripture metadata and keep the matches."""
+    results = await fuse_lexical(results, lexical_task)
+    if settings.RERANK_ENABLED:
+        from app.services.rerank import rerank
+        with span("rerank", candidates=len(results)):
+            results = await rerank(text, results, settings.RERANK_KEEP, settings.RERANK_BUDGET_MS)
+    return await resolve_matches(results, metadata_task)
+
+async def embed_and_retrieve(db, text: str):
+    """Stage: embed the query, then vector search. Returns (query_vector, matches).
+
+    With HYBRID_SEARCH, a BM25 lookup runs alongside and the two rankings are fused
+    with reciprocal-rank fusion; it is dropped if it misses its latency budget.
+    With RERANK_ENABLED, RERANK_CANDIDATES are fetched and a cross-encoder keeps the
+    best RERANK_KEEP (vector order is kept if it misses RERANK_BUDGET_MS).
+    """
+    metadata_task = start_metadata_lookup(db)
+    lexical_task = start_lexical_search(text)
+
+    # 1. Embed user message using local model
+    query_vector = None
+    try:
+        from app.services.embedding import embed_query
+        with span("embed"):
+            query_vector = await embed_query(text)
+    except Exception as e:
+        log_event("embedding.error", logging.ERROR, error=str(e))
+
+    # 2. Vector Search Retrieval — track sources and confidence
+    limit, _ = retrieval_limits()
+    results = []
+    if query_vector:
         try:
-            from groq import AsyncGroq
-            groq_client = AsyncGroq(api_key=settings.GROQ_API_KEY)
-            
-            for attempt in range(3):
-                try:
-                    chat_completion = await groq_client.chat.completions.create(
-                        messages=[
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": user_prompt}
-                        ],
-                        model="llama-3.3-70b-versatile",
-                        temperature=0.7,
-                        max_tokens=4096,
-                    )
-                    result = chat_completion.choices[0].message.content
-                    print(f"[LLM] Groq llama-3.3-70b responded successfully")
-                    return result or ""
-                except Exception as e:
-                    error_str = str(e)
-                    if any(k in error_str for k in ["429", "rate_limit", "503", "overloaded"]):
-                        wait_time = (2 ** attempt) + 1
-                        print(f"[Groq] Attempt {attempt+1} rate limited, retrying in {wait_time}s...")
-                        await asyncio.sleep(wait_time)
-                        continue
-                    else:
-                        print(f"[Groq] Non-retryable error: {e}")
-                        break  # Fall through to Gemini
+            with span("vector_search", limit=limit):
+                results = await asyncio.to_thread(retrieve_chunks, db, query_vector, limit)
         except Exception as e:
-            print(f"[Groq] Provider failed: {e}")
+            log_event("vector_search.error", logging.ERROR, error=str(e))
 
-    # --- Provider 2: Gemini (Fallback) ---
-    print("[LLM] Falling back to Gemini...")
-    full_prompt = f"{system_prompt}\n\n{user_prompt}"
-    client = genai.Client()
-    
-    models_to_try = ["gemini-2.5-flash", "gemini-2.0-flash"]
-    last_error = None
-    
-    for model_name in models_to_try:
-        for attempt in range(3):
+    return query_vector, await refine_results(text, results, lexical_task, metadata_task)
+
+async def retrieve_many(db, query_vectors: list, limit: int) -> list[list[dict]]:
+    """Vector search for several queries: one matrix query on the local index, else concurrent Firestore queries."""
+    if settings.LOCAL_VECTOR_INDEX:
+        from app.services.vector_index import get_vector_index
+        index = get_vector_index()
+        if index.ready.is_set():
+            return await asyncio.to_thread(index.search_many, query_vectors, limit)
+
+    async def one(vector):
+        try:
+            return await asyncio.to_thread(retrieve_chunks, db, vector, limit)
+        except Exception as e:
+            log_event("vector_search.error", logging.ERROR, error=str(e))
+            return []
+    return await asyncio.gather(*(one(v) for v in query_vectors))
+
+HISTORY_WINDOW = 4       # raw messages sent to the LLM
+SUMMARY_LOOKBACK = 2     # older messages also read so they can be folded into the summary
+
+def fetch_history(messages_ref, limit: int = HISTORY_WINDOW) -> list[dict]:
+    """Stage: last `limit` messages of the conversation, oldest first."""
+    with span("history_fetch"):
+        past_msgs = messages_ref.order_by("timestamp", direction=firestore.Query.DESCENDING).limit(limit).stream()
+        return [msg.to_dict() for msg in past_msgs][::-1]
+
+def read_conversation(conv_ref):
+    """Stage: the conversation document (existence, title, rolling summary)."""
+    with span("conversation_read"):
+        return conv_ref.get()
+
+_pending_writes = set()   # strong refs to answer writes that outlive their request
+
+@firestore.transactional
+def write_unless_deleting(transaction, conv_ref, message_ref, message: dict, conv_fields: Optional[dict] = None) -> bool:
+    """Write a message only while its conversation still exists and isn't being deleted.
+
+    The conversation read is part of the transaction, so a deletion started between the
+    read and the commit makes it retry and skip: no message can land after the
+    deletion job's sweep and outlive its conversation.
+    """
+    snapshot = conv_ref.get(transaction=transaction)
+    if not snapshot.exists or (snapshot.to_dict() or {}).get("deleting"):
+        return False
+    transaction.set(message_ref, message)
+    if conv_fields:
+        transaction.update(conv_ref, conv_fields)
+    return True
+
+def save_assistant_message(db, conv_ref, messages_ref, content: str, sources: list[dict], has_scripture_match: bool):
+    """Stage: persist the assistant's answer with its sources."""
+    with span("assistant_write"):
+        saved = write_unless_deleting(db.transaction(), conv_ref, messages_ref.document(), {
+            "role": "assistant",
+            "content": content,
+            "sources": sources,
+            "has_scripture_match": has_scripture_match,
+            "timestamp": utc_now()
+        })
+    if not saved:
+        log_event("chat.write_skipped", role="assistant", conversation=conv_ref.id)
+
+def save_user_message(db, conv_ref, messages_ref, content: str, timestamp):
+    """Stage: write the user message and bump the conversation in one transaction."""
+    with span("user_write"):
+        saved = write_unless_deleting(db.transaction(), conv_ref, messages_ref.document(), {
+            "role": "user",
+            "content": content,
+            "timestamp": timestamp
+        }, {"updatedAt": utc_now()})
+    if not saved:
+        log_event("chat.write_skipped", role="user", conversation=conv_ref.id)
+
+def hold_slot_while_streaming(response: StreamingResponse, ticket, background_tasks: BackgroundTasks,
+                              on_finish=None) -> StreamingResponse:
+    """A streamed answer keeps its admission slot until the body is finished (or the client goes away).
+
+    `on_finish`, if given, is called once the body is done, e.g. to record request time.
+    """
+    body = response.body_iterator
+    async def release_when_done():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            ticket.release()
+            if on_finish is not None:
+                on_finish()
+    response.body_iterator = release_when_done()
+    background_tasks.add_task(ticket.release)  # backstop if the body is never iterated
+    return response
+
+class QuestionBatch(BaseModel):
+    questions: List[str]
+
+async def answer_question(index: int, question: str, query_vector, results: list[dict],
+                          metadata_task, llm_slots: asyncio.Semaphore) -> dict:
+    """One batch item: pick matches from its fused (and re-ranked) results, then answer without history."""
+    matches = await resolve_matches(results, metadata_task)
+    prompt = assemble_prompt(question, matches, [])
+    result = {
+        "type": "result",
+        "index": index,
+        "question": question,
+        "sources": prompt["sources"],
+        "has_scripture_match": prompt["has_scripture_match"],
+        "prompt_tokens": prompt["prompt_tokens"],
+    }
+
+    answer_cache = None
+    if settings.ANSWER_CACHE_ENABLED and query_vector:
+        from app.services.answer_cache import get_answer_cache
+        answer_cache = get_answer_cache()
+        cached = answer_cache.lookup(query_vector, prompt["sources"])
+        if cached:
+            return {**result, "content": cached["content"], "cached": True}
+
+    async with llm_slots:
+        with span("llm", route="batch"):
+            content = await generate_ai_response(question, prompt["context_str"], "", prompt["has_scripture_match"])
+    if answer_cache is not None:
+        answer_cache.store(query_vector, content, prompt["sources"], prompt["has_scripture_match"])
+    return {**result, "content": content}
+
+@router.post("/chat/batch")
+async def answer_questions(payload: QuestionBatch, background_tasks: BackgroundTasks, user: dict = Depends(get_current_user)):
+    """Answer several standalone questions (no conversation, nothing saved) as NDJSON.
+
+    All questions are embedded in one encode call, searched together (one matrix
+    query against the local index, or concurrent Firestore queries) and re-ranked in
+    one cross-encoder pass. LLM calls run at most CHAT_BATCH_LLM_CONCURRENCY at a
+    time, and the batch holds that many admission slots so it counts against
+    CHAT_MAX_IN_FLIGHT like as many chats. Each `result` event (with its `index` in
+    the request) is sent as soon as that answer is ready, then `done`.
+    """
+    questions = [q.strip() for q in payload.questions]
+    if not questions or not all(questions):
+        raise HTTPException(status_code=400, detail="Questions must be non-empty")
+    if len(questions) > settings.CHAT_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.CHAT_BATCH_MAX_QUESTIONS} questions per batch")
+
+    from app.services.admission import get_admission_controller
+    started_at = time.perf_counter()
+    llm_concurrency = min(settings.CHAT_BATCH_LLM_CONCURRENCY, len(questions))
+    ticket = await get_admission_controller().acquire(user.get("uid"), slots=llm_concurrency)
+    try:
+        db = get_db()
+        metadata_task = start_metadata_lookup(db)
+        lexical_tasks = [start_lexical_search(q) for q in questions]
+
+        query_vectors = [None] * len(questions)
+        try:
+            from app.services.embedding import embed_queries
+            with span("embed", route="batch", questions=len(questions)):
+                query_vectors = await embed_queries(questions)
+        except Exception as e:
+            log_event("embedding.error", logging.ERROR, error=str(e))
+        limit, _ = retrieval_limits()
+        if all(query_vectors):
+            with span("vector_search", route="batch", questions=len(questions)):
+                results = await retrieve_many(db, query_vectors, limit)
+        else:
+            results = [[] for _ in questions]
+
+        results = await asyncio.gather(*[fuse_lexical(r, t) for r, t in zip(results, lexical_tasks)])
+        if settings.RERANK_ENABLED:
+            from app.services.rerank import rerank_many
+            # One forward pass for the whole batch; the budget grows with its size
+            with span("rerank", route="batch", questions=len(questions)):
+                results = await rerank_many(questions, results, settings.RERANK_KEEP,
+                                            settings.RERANK_BUDGET_MS * len(questions))
+    except BaseException:
+        ticket.release()
+        raise
+
+    async def event_stream():
+        llm_slots = asyncio.Semaphore(llm_concurrency)
+
+        async def run(i: int, question: str) -> dict:
             try:
-                response = await client.aio.models.generate_content(
-                    model=model_name,
-                    contents=full_prompt
-                )
-                print(f"[LLM] Gemini {model_name} responded successfully")
-                return response.text or ""
+                return await answer_question(i, question, query_vectors[i], results[i],
+                                             metadata_task, llm_slots)
             except Exception as e:
-                last_error = e
-                error_str = str(e)
-                is_retryable = any(k in error_str for k in ["503", "UNAVAILABLE", "429", "RESOURCE_EXHAUSTED", "overloaded"])
-                
-                if is_retryable:
-                    import re
-                    delay_match = re.search(r'retryDelay.*?(\d+)', error_str)
-                    wait_time = int(delay_match.group(1)) if delay_match else (2 ** attempt) + 1
-                    wait_time = min(wait_time, 30)
-                    print(f"[Gemini] {model_name} attempt {attempt+1} transient error, retrying in {wait_time}s...")
-                    await asyncio.sleep(wait_time)
-                    continue
-                else:
-                    raise
-        print(f"[Gemini] All retries exhausted for {model_name}, trying next model...")
-    
-    raise last_error
+                return {"type": "error", "index": i, "question": question, "content": f"[AI Error]: {str(e)}"}
+
+        tasks = [asyncio.create_task(run(i, q)) for i, q in enumerate(questions)]
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield ndjson_line(await done)
+            yield ndjson_line({"type": "done", "count": len(questions)})
+        finally:
+            # Client went away: stop paying for answers nobody will read
+            for task in tasks:
+                task.cancel()
+
+    def record_request():
+        REQUEST_SECONDS.observe(time.perf_counter() - started_at, route="batch", stream="true")
+
+    response = StreamingResponse(event_stream(), media_type="application/x-ndjson")
+    return hold_slot_while_streaming(response, ticket, background_tasks, on_finish=record_request)
 
 @router.post("/chat/{convId}")
-async def send_chat_message(convId: str, payload: ChatMessage, background_tasks: BackgroundTasks, user: dict = Depends(get_current_user)):
-    db = get_db()
+async def send_chat_message(convId: str, payload: ChatMessage, background_tasks: BackgroundTasks, stream: bool = False, user: dict = Depends(get_current_user)):
+    """Answer a chat message with RAG.
+
+    With `?stream=true` the response is NDJSON: a `sources` event first, then one `token`
+    event per streamed chunk, then `done`. The assistant message is saved when the stream ends.
+
+    Requests pass an admission controller first: over the per-user or global in-flight
+    cap they queue briefly or get a fast 429/503 with Retry-After.
+    """
+    from app.services.admission import get_admission_controller
     uid = user.get("uid")
+    started_at = time.perf_counter()
+
+    def record_request():
+        REQUEST_SECONDS.observe(time.perf_counter() - started_at, route="chat", stream=str(stream).lower())
+
+    ticket = await get_admission_controller().acquire(uid)
+    try:
+        response = await answer_chat_message(convId, payload, background_tasks, stream, uid)
+    except BaseException:
+        ticket.release()
+        raise
+    if not isinstance(response, StreamingResponse):
+        ticket.release()
+        record_request()
+        return response
+    return hold_slot_while_streaming(response, ticket, background_tasks, on_finish=record_request)
+
+async def answer_chat_message(convId: str, payload: ChatMessage, background_tasks: BackgroundTasks, stream: bool, uid: str):
+    """The RAG pipeline behind send_chat_message. Stages run as a dependency graph:
+
+        conversation read ──┬──> user message write (off the critical path)
+        history read ───────┤
+        embed → search ─────┴──> answer cache / LLM → assistant message write
+    """
+    db = get_db()
     conv_ref = db.collection("users").document(uid).collection("conversations").document(convId)
-    
-    if not conv_ref.get().exists:
-        raise HTTPException(status_code=404, detail="Conversation not found")
-        
     messages_ref = conv_ref.collection("messages")
     now = utc_now()
-    
-    # 1. Embed user message using local model
-    query_vector = None
-    try:
-        from app.services.embedding import get_embedding_model
-        embed_model = get_embedding_model()
-        query_vector = [float(v) for v in embed_model.encode(payload.content)]
-    except Exception as e:
-        print(f"Embedding error: {e}")
+    started_at = time.perf_counter()
 
-    # 2. Vector Search Retrieval — track sources and confidence
-    context_str = ""
-    sources = []
-    has_scripture_match = False
-    MATCH_THRESHOLD = 0.85  # cosine distance 0=identical, 1=orthogonal. 0.85 allows broad conceptual relevance
+    conv_task = asyncio.create_task(asyncio.to_thread(read_conversation, conv_ref))
+    retrieval_task = asyncio.create_task(embed_and_retrieve(db, payload.content))
+    # With a rolling summary, also read the turn that just slid out of the raw window
+    history_limit = HISTORY_WINDOW + (SUMMARY_LOOKBACK if settings.PROMPT_ROLLING_SUMMARY else 0)
+    history_task = asyncio.create_task(asyncio.to_thread(fetch_history, messages_ref, history_limit))
 
-    if query_vector:
+    conv_snapshot = await conv_task
+    if not conv_snapshot.exists or (conv_snapshot.to_dict() or {}).get("deleting"):
+        retrieval_task.cancel()
+        history_task.cancel()
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    # 3. Extract History — the raw window goes into the prompt, anything older only into the summary
+    fetched = await history_task
+    past_list = fetched[-HISTORY_WINDOW:]
+    fell_out = fetched[:-HISTORY_WINDOW]
+    conv_data = conv_snapshot.to_dict() or {}
+
+    # 4. Save user message to Firestore — history has been read, so it can't leak in
+    user_write_task = asyncio.create_task(
+        asyncio.to_thread(save_user_message, db, conv_ref, messages_ref, payload.content, now)
+    )
+
+    query_vector, matches = await retrieval_task
+
+    # Fit context and history into the prompt token budget
+    with span("prompt"):
+        prompt = assemble_prompt(payload.content, matches, past_list, conv_data.get("summary", ""))
+    context_str = prompt["context_str"]
+    sources = prompt["sources"]
+    history_str = prompt["history_str"]
+    has_scripture_match = prompt["has_scripture_match"]
+    prompt_tokens = prompt["prompt_tokens"]
+    log_event("chat.pre_llm", ms=round((time.perf_counter() - started_at) * 1000, 1), prompt_tokens=prompt_tokens,
+              chunks=len(sources), history=len(past_list))
+
+    # Semantic answer cache — only safe when there is no history to shape the answer
+    answer_cache = None
+    cached = None
+    if settings.ANSWER_CACHE_ENABLED and query_vector and not past_list:
+        from app.services.answer_cache import get_answer_cache
+        answer_cache = get_answer_cache()
+        cached = answer_cache.lookup(query_vector, sources)
+
+    # 7. Auto-title logic — reuses the first conversation read
+    if conv_data.get("title") == "New Conversation":
+        background_tasks.add_task(background_generate_title, uid, convId, db, payload.content)
+
+    # Rolling summary — fold turns that left the raw history window into the conversation doc
+    if settings.PROMPT_ROLLING_SUMMARY and fell_out:
+        background_tasks.add_task(background_update_summary, db, conv_ref, fell_out)
+
+    if stream:
+        async def write_answer(content: str):
+            await user_write_task
+            await asyncio.to_thread(save_assistant_message, db, conv_ref, messages_ref, content, sources, has_scripture_match)
+
+        def persist_answer(content: str) -> asyncio.Task:
+            # Its own task, so the write outlives a cancelled response
+            task = asyncio.create_task(write_answer(content))
+            _pending_writes.add(task)
+            task.add_done_callback(_pending_writes.discard)
+            return task
+
+        async def event_stream():
+            parts = []
+            persist_task = None
+            try:
+                yield ndjson_line({"type": "sources", "sources": sources, "has_scripture_match": has_scripture_match, "prompt_tokens": prompt_tokens})
+                if cached:
+                    parts.append(cached["content"])
+                    yield ndjson_line({"type": "token", "content": cached["content"]})
+                else:
+                    try:
+                        with span("llm", stream="true"):
+                            async for delta in stream_ai_response(payload.content, context_str, history_str, has_scripture_match):
+                                parts.append(delta)
+                                yield ndjson_line({"type": "token", "content": delta})
+                        if answer_cache is not None:
+                            answer_cache.store(query_vector, "".join(parts), sources, has_scripture_match)
+                    except Exception as e:
+                        error_text = f"[AI Error]: {str(e)}"
+                        parts.append(error_text)
+                        yield ndjson_line({"type": "error", "content": error_text})
+
+                # Persist once the full answer is known
+                persist_task = persist_answer("".join(parts))
+                await asyncio.shield(persist_task)
+                yield ndjson_line({"type": "done"})
+            finally:
+                # Client went away mid-answer: keep what was already generated (and paid for)
+                if persist_task is None and parts:
+                    persist_answer("".join(parts))
+
+        return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+    
+    # 5. Generate AI response (or reuse a cached answer)
+    if cached:
+        ai_text = cached["content"]
+    else:
         try:
-            results = db.collection("scripture_chunks").find_nearest(
-                vector_field="embedding",
-                query_vector=Vector(query_vector),
-                distance_measure=DistanceMeasure.COSINE,
-                limit=5,
-                distance_result_field="vector_distance"
-            ).stream()
-            
-            for match in results:
-                data = match.to_dict()
-                md = data.get("metadata", {})
-                ch_title = md.get("title", "Unknown Scripture")
-                text_content = data.get("text", "")
-                chunk_index = data.get("chunkIndex", 0)
-                scripture_id = data.get("scriptureId", "")
-                distance = data.get("vector_distance", 1.0)
-
-                print(f"[RAG] Chunk distance={distance:.4f} title={ch_title}")
-
-                if distance < MATCH_THRESHOLD:
-                    has_scripture_match = True
-                    context_str += f"\n[Source: {ch_title}]\n{text_content}\n"
-                    sources.append({
-                        "type": "scripture",
-                        "title": ch_title,
-                        "scriptureId": scripture_id,
-                        "chunkIndex": chunk_index,
-                        "snippet": text_content[:200] + "..." if len(text_content) > 200 else text_content,
-                    })
+            with span("llm", stream="false"):
+                ai_text = await generate_ai_response(payload.content, context_str, history_str, has_scripture_match)
+            if answer_cache is not None:
+                answer_cache.store(query_vector, ai_text, sources, has_scripture_match)
         except Exception as e:
-            print(f"[Vector Search Error]: {e}")
-            context_str = ""
-    
-    # 3. Extract History
-    history_str = ""
-    past_msgs = messages_ref.order_by("timestamp", direction=firestore.Query.DESCENDING).limit(4).stream()
-    past_list = []
-    for msg in past_msgs:
-        past_list.append(msg.to_dict())
-    
-    for msg in reversed(past_list):
-        history_str += f"{msg['role'].capitalize()}: {msg['content']}\n"
-        
-    # 4. Save user message to Firestore
-    user_msg_ref = messages_ref.document()
-    user_msg_ref.set({
-        "role": "user",
-        "content": payload.content,
-        "timestamp": now
-    })
-    
-    conv_ref.update({"updatedAt": utc_now()})
-    
-    # 5. Generate AI response
-    try:
-        ai_text = await generate_ai_response(payload.content, context_str, history_str, has_scripture_match)
-    except Exception as e:
-        ai_text = f"[AI Error]: {str(e)}"
+            ai_text = f"[AI Error]: {str(e)}"
     
     # 6. Save assistant message with sources metadata
-    assist_msg_ref = messages_ref.document()
-    assist_msg_ref.set({
-        "role": "assistant",
-        "content": ai_text,
-        "sources": sources,
-        "has_scripture_match": has_scripture_match,
-        "timestamp": utc_now()
-    })
-    
-    # 7. Auto-title logic
-    conv_doc = conv_ref.get().to_dict()
-    if conv_doc.get("title") == "New Conversation":
-        background_tasks.add_task(background_generate_title, uid, convId, db, payload.content)
+    await user_write_task
+    await asyncio.to_thread(save_assistant_message, db, conv_ref, messages_ref, ai_text, sources, has_scripture_match)
         
-    return {"content": ai_text, "sources": sources, "has_scripture_match": has_scripture_match}
+    return {"content": ai_text, "sources": sources, "has_scripture_match": has_scripture_match, "prompt_tokens": prompt_tokens}
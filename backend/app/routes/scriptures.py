@@ -1,31 +1,22 @@
+import asyncio
 import os
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import RedirectResponse
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
 from typing import Optional
 from app.db.firestore import get_db
 from app.middleware.auth import get_current_user
 from app.core.config import settings
-from firebase_admin import storage
+from app.services.answer_cache import invalidate_scripture_answers
+from app.services.catalog import get_scripture_catalog, invalidate_catalog, etag_response
+from app.services.blob_cache import CachedFile, get_blob_cache, evict_blob, file_response
 
 router = APIRouter(prefix="/api/scriptures", tags=["scriptures"])
 
 @router.get("/")
-async def get_scriptures():
-    """Public endpoint — no auth required. Lists all scriptures."""
-    db = get_db()
-    docs = db.collection("scriptures").order_by("addedAt", direction="DESCENDING").stream()
-    
-    scriptures = []
-    for doc in docs:
-        data = doc.to_dict()
-        data["id"] = doc.id
-        # Convert timestamps to ISO strings for JSON serialization
-        if data.get("addedAt"):
-            data["addedAt"] = data["addedAt"].isoformat() if hasattr(data["addedAt"], "isoformat") else str(data["addedAt"])
-        scriptures.append(data)
-        
-    return {"scriptures": scriptures}
+async def get_scriptures(request: Request):
+    """Public endpoint — no auth required. Lists all scriptures (served from the catalog cache)."""
+    body, etag = await asyncio.to_thread(get_scripture_catalog().get, get_db(), "public")
+    return etag_response(request, body, etag, cache_control="public, no-cache")
 
 @router.delete("/{scriptureId}")
 async def delete_scripture(scriptureId: str, user: dict = Depends(get_current_user)):
@@ -60,6 +51,7 @@ async def delete_scripture(scriptureId: str, user: dict = Depends(get_current_us
     storage_path = data.get("storagePath")
     if storage_path:
         try:
+            from firebase_admin import storage
             bucket = storage.bucket()
             blob = bucket.blob(storage_path)
             if blob.exists():
@@ -69,6 +61,9 @@ async def delete_scripture(scriptureId: str, user: dict = Depends(get_current_us
             
     # 3. Delete scripture document
     scripture_ref.delete()
+    evict_blob(storage_path)
+    invalidate_catalog()
+    invalidate_scripture_answers(scriptureId)
     
     
     return {"status": "deleted", "chunksDeleted": count, "scriptureId": scriptureId}
@@ -82,7 +77,7 @@ class ScriptureUpdate(BaseModel):
 
 @router.put("/{scriptureId}")
 async def update_scripture(scriptureId: str, update_data: ScriptureUpdate, user: dict = Depends(get_current_user)):
-    """Admin-only endpoint to update a scripture's metadata and propagate it to all chunks."""
+    """Admin-only endpoint to update a scripture's metadata. One document write."""
     admin_uid = settings.ADMIN_UID
     if not admin_uid or user.get("uid") != admin_uid:
         raise HTTPException(status_code=403, detail="Forbidden. Admin access required.")
@@ -94,43 +89,29 @@ async def update_scripture(scriptureId: str, update_data: ScriptureUpdate, user:
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Scripture not found")
         
-    # 1. Update main scripture document
+    # Chunks carry no copy of these fields; search results join them from the catalog
     scripture_ref.update({
         "title": update_data.title,
         "language": update_data.language,
         "author": update_data.author,
         "description": update_data.description
     })
-    
-    # 2. Update all associated vector chunks so RAG cites the correct title
-    chunks = db.collection("scripture_chunks").where("scriptureId", "==", scriptureId).stream()
-    batch = db.batch()
-    count = 0
-    for chunk in chunks:
-        # We update the nested metadata
-        batch.update(chunk.reference, {
-            "metadata.title": update_data.title,
-            "metadata.language": update_data.language,
-            "metadata.author": update_data.author
-        })
-        count += 1
-        if count % 490 == 0:
-            batch.commit()
-            batch = db.batch()
-            
-    if count % 490 != 0:
-        batch.commit()
+    invalidate_catalog()
+    invalidate_scripture_answers(scriptureId)
         
-    return {"status": "updated", "scriptureId": scriptureId, "chunksUpdated": count}
+    return {"status": "updated", "scriptureId": scriptureId}
 
 
 @router.get("/{scriptureId}/download")
 @router.get("/{scriptureId}/download/{filename}")
-async def get_scripture_download_url(scriptureId: str, filename: str = None):
-    """Return a download URL or serve the file directly."""
-    from fastapi.responses import FileResponse
+async def get_scripture_download_url(request: Request, scriptureId: str, filename: str = None):
+    """Serve the scripture PDF with Range (206), ETag and Last-Modified support.
+
+    Storage blobs are served from a bounded local disk cache, so repeat and partial
+    downloads don't pull the whole file from Storage again.
+    """
     db = get_db()
-    doc = db.collection("scriptures").document(scriptureId).get()
+    doc = await asyncio.to_thread(db.collection("scriptures").document(scriptureId).get)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Scripture not found")
     
@@ -139,42 +120,24 @@ async def get_scripture_download_url(scriptureId: str, filename: str = None):
     storage_path = data.get("storagePath")
     local_path = data.get("localFilePath")
 
-    import datetime
-    from fastapi.responses import RedirectResponse, FileResponse, StreamingResponse
-    
-    # Option 1: Native Firebase Storage Direct Stream (bypasses URL signing IAM errors)
+    # Option 1: Firebase Storage, via the local disk cache (bypasses URL signing IAM errors)
     if storage_path:
         try:
-            bucket = storage.bucket()
-            blob = bucket.blob(storage_path)
-            if blob.exists():
-                def iterfile():
-                    # Stream in 1MB chunks natively using the blob reader
-                    with blob.open('rb') as f:
-                        while chunk := f.read(1024 * 1024):
-                            yield chunk
-                
-                return StreamingResponse(
-                    iterfile(),
-                    media_type="application/pdf",
-                    headers={"Content-Disposition": f'attachment; filename="{title}.pdf"'}
-                )
+            from firebase_admin import storage
+            entry = await asyncio.to_thread(get_blob_cache().get, storage.bucket(), storage_path)
+            if entry is not None:
+                return file_response(request, entry, "application/pdf", f"{title}.pdf")
         except Exception as e:
             print(f"Storage proxy failed, falling back to local: {e}")
 
     # Option 2: Serve direct from admin's local filesystem (dev fallback)
     if local_path and os.path.exists(local_path):
-        filename = os.path.basename(local_path)
-        return FileResponse(
-            path=local_path,
-            media_type="application/pdf",
-            filename=f"{title}.pdf",
-            headers={"Content-Disposition": f'attachment; filename="{title}.pdf"'}
-        )
+        stat = os.stat(local_path)
+        entry = CachedFile(local_path, stat.st_size, f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"', stat.st_mtime)
+        return file_response(request, entry, "application/pdf", f"{title}.pdf")
 
     # Option 3: Clear user-facing error
     raise HTTPException(
         status_code=404,
         detail=f"'{title}' PDF is not available for download. Please ensure Firebase Storage is enabled and the file has been uploaded."
     )
-
@@ -0,0 +1,197 @@
+import asyncio
+import threading
+import time
+from fastapi import HTTPException
+
+
+class Ticket:
+    """An admitted request's slot. `release()` is idempotent and may be called from any
+    thread (e.g. a sync background task); the bookkeeping always runs on the event loop.
+    """
+
+    def __init__(self, controller: "AdmissionController", uid: str, slots: int = 1):
+        self._controller = controller
+        self._loop = asyncio.get_running_loop()
+        self.uid = uid
+        self.slots = slots
+        self.admitted_at = time.monotonic()
+        self._released = False
+
+    def release(self):
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._release()
+        else:
+            self._loop.call_soon_threadsafe(self._release)
+
+    def _release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self)
+
+
+class AdmissionController:
+    """Caps concurrent chat requests globally and per user, with a bounded wait queue.
+
+    A request over the per-user cap (admitted plus queued) is rejected at once (429),
+    so one user can't fill the queue. Otherwise it takes its
+    global slots (one per request, or one per concurrent LLM call for a batch), or
+    waits for them in FIFO order — but only if the queue has room and the expected
+    wait fits its deadline; anything else gets a fast 503. Both carry a Retry-After
+    estimated from recent request durations.
+
+    `max_queue` and `queue_timeout` are two independent limits on the queue: it never
+    holds more than `max_queue` requests, and a request only joins when its estimated
+    wait (position × average duration / max_in_flight) is within `queue_timeout`. With
+    the defaults (32 slots, 5 s deadline) the deadline is the tighter one once requests
+    average more than ~2.5 s. The first waiter is always queued, since its wait can't be
+    estimated better than "the next release", and the estimate is only applied once a
+    request has completed.
+
+    Runs on the event loop only, so the counters need no lock.
+    """
+
+    def __init__(self, max_in_flight: int = 32, max_per_user: int = 2, max_queue: int = 64,
+                 queue_timeout: float = 5.0):
+        self.max_in_flight = max_in_flight
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._per_user = {}
+        self._waiters = []          # FIFO of (future, slots) waiting for capacity
+        self._avg_duration = None   # EWMA of admitted request durations (seconds), once known
+        self.admitted = 0
+        self.rejected_user = 0
+        self.rejected_queue = 0
+        self.rejected_deadline = 0
+
+    def _expected_wait(self, position: int = 0) -> float:
+        # Slots free up at roughly max_in_flight / avg_duration per second
+        if self._avg_duration is None:
+            return 0.0
+        return (position + 1) * self._avg_duration / max(1, self.max_in_flight)
+
+    def _retry_after(self, position: int = 0) -> int:
+        return max(1, int(self._expected_wait(position) + 0.999))
+
+    def _reject(self, status_code: int, detail: str, position: int = 0):
+        raise HTTPException(status_code=status_code, detail=detail,
+                            headers={"Retry-After": str(self._retry_after(position))})
+
+    async def acquire(self, uid: str, slots: int = 1) -> Ticket:
+        """Admit a request holding `slots` global slots (capped at max_in_flight)."""
+        slots = max(1, min(slots, self.max_in_flight))
+        if self._per_user.get(uid, 0) >= self.max_per_user:
+            self.rejected_user += 1
+            self._reject(429, "Too many requests in progress. Please wait for the current answer.")
+
+        # Counted from here on, while queued as well as once admitted
+        self._per_user[uid] = self._per_user.get(uid, 0) + 1
+        try:
+            await self._take_slots(slots)
+        except BaseException:
+            self._drop_user(uid)
+            raise
+        self.admitted += 1
+        return Ticket(self, uid, slots)
+
+    async def _take_slots(self, slots: int):
+        if self._in_flight + slots > self.max_in_flight or self._waiters:
+            position = len(self._waiters)
+            if position >= self.max_queue:
+                self.rejected_queue += 1
+                self._reject(503, "Server is busy. Please try again shortly.", position)
+            # Don't queue a request that is expected to miss its deadline anyway
+            if position > 0 and self._expected_wait(position) > self.queue_timeout:
+                self.rejected_deadline += 1
+                self._reject(503, "Server is busy. Please try again shortly.", position)
+
+            entry = (asyncio.get_running_loop().create_future(), slots)
+            self._waiters.append(entry)
+            try:
+                await asyncio.wait_for(asyncio.shield(entry[0]), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                if entry[0].done():
+                    # The slots were granted just as the deadline hit; give them back
+                    self._free(slots)
+                else:
+                    self._waiters.remove(entry)
+                    self._admit_waiters()
+                self.rejected_deadline += 1
+                self._reject(503, "Server is busy. Please try again shortly.", len(self._waiters))
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    self._admit_waiters()
+                elif entry[0].done():
+                    self._free(slots)
+                raise
+            # _admit_waiters already counted our slots in _in_flight
+        else:
+            self._in_flight += slots
+
+    def _drop_user(self, uid: str):
+        count = self._per_user.get(uid, 1) - 1
+        if count:
+            self._per_user[uid] = count
+        else:
+            self._per_user.pop(uid, None)
+
+    def _free(self, slots: int):
+        self._in_flight -= slots
+        self._admit_waiters()
+
+    def _admit_waiters(self):
+        """Grant freed capacity to waiters in FIFO order while the head one fits."""
+        while self._waiters:
+            future, slots = self._waiters[0]
+            if future.done():
+                self._waiters.pop(0)
+                continue
+            if self._in_flight + slots > self.max_in_flight:
+                return
+            self._waiters.pop(0)
+            self._in_flight += slots
+            future.set_result(None)
+
+    def _release(self, ticket: Ticket):
+        duration = time.monotonic() - ticket.admitted_at
+        if self._avg_duration is None:
+            self._avg_duration = duration
+        else:
+            self._avg_duration = 0.9 * self._avg_duration + 0.1 * duration
+        self._drop_user(ticket.uid)
+        self._free(ticket.slots)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self._in_flight,
+            "queued": len(self._waiters),
+            "max_in_flight": self.max_in_flight,
+            "admitted": self.admitted,
+            "rejected_per_user": self.rejected_user,
+            "rejected_queue_full": self.rejected_queue,
+            "rejected_deadline": self.rejected_deadline,
+            "avg_duration_seconds": self._avg_duration,
+        }
+
+
+_controller = None
+_lock = threading.Lock()
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+    with _lock:
+        if _controller is None:
+            from app.core.config import settings
+            _controller = AdmissionController(
+                max_in_flight=settings.CHAT_MAX_IN_FLIGHT,
+                max_per_user=settings.CHAT_MAX_PER_USER,
+                max_queue=settings.CHAT_MAX_QUEUE,
+                queue_timeout=settings.CHAT_QUEUE_TIMEOUT_SECONDS,
+            )
+    return _controller
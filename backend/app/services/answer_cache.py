@@ -0,0 +1,143 @@
+import threading
+import time
+import numpy as np
+from app.core.config import settings
+from app.core.log import log_event
+
+
+class SemanticAnswerCache:
+    """Answers for near-duplicate questions, keyed by query embedding plus the retrieved source set.
+
+    Query vectors live in a fixed-size float32 matrix (one slot per entry) so a lookup
+    is a single matmul over all cached questions.
+    """
+
+    def __init__(self, max_size: int = 512, threshold: float = 0.95, ttl_seconds: float = 86400, dims: int = 768):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl = ttl_seconds
+        self._matrix = np.zeros((max_size, dims), dtype=np.float32)
+        self._entries = [None] * max_size   # slot -> entry dict
+        self._free = list(range(max_size - 1, -1, -1))
+        self._lock = threading.Lock()
+        self._tick = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def source_key(sources: list[dict]) -> frozenset:
+        return frozenset((s.get("scriptureId", ""), s.get("chunkIndex", 0)) for s in sources)
+
+    def _release(self, slot: int):
+        self._entries[slot] = None
+        self._matrix[slot] = 0.0
+        self._free.append(slot)
+
+    def lookup(self, query_vector, sources: list[dict]):
+        """Return the cached entry for a similar question with the same sources, or None."""
+        q = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm > 0:
+            q = q / norm
+        key = self.source_key(sources)
+        now = time.monotonic()
+
+        with self._lock:
+            scores = self._matrix @ q
+            for slot in np.argsort(-scores):
+                if scores[slot] < self.threshold:
+                    break
+                entry = self._entries[slot]
+                if entry is None:
+                    continue
+                if entry["expires_at"] <= now:
+                    self._release(slot)
+                    self.evictions += 1
+                    continue
+                if entry["source_key"] != key:
+                    continue
+                self._tick += 1
+                entry["last_used"] = self._tick
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def store(self, query_vector, answer: str, sources: list[dict], has_scripture_match: bool):
+        q = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm > 0:
+            q = q / norm
+
+        with self._lock:
+            if not self._free:
+                # Evict the least recently used entry
+                victim = min(range(self.max_size), key=lambda i: self._entries[i]["last_used"])
+                self._release(victim)
+                self.evictions += 1
+            slot = self._free.pop()
+            self._tick += 1
+            self._matrix[slot] = q
+            self._entries[slot] = {
+                "content": answer,
+                "sources": sources,
+                "has_scripture_match": has_scripture_match,
+                "source_key": self.source_key(sources),
+                "scripture_ids": {s.get("scriptureId", "") for s in sources},
+                "expires_at": time.monotonic() + self.ttl,
+                "last_used": self._tick,
+            }
+
+    def invalidate_scripture(self, scripture_id: str) -> int:
+        """Drop every cached answer that cited `scripture_id`."""
+        removed = 0
+        with self._lock:
+            for slot, entry in enumerate(self._entries):
+                if entry is not None and scripture_id in entry["scripture_ids"]:
+                    self._release(slot)
+                    removed += 1
+            self.invalidations += removed
+        return removed
+
+    def clear(self):
+        with self._lock:
+            for slot, entry in enumerate(self._entries):
+                if entry is not None:
+                    self._release(slot)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": self.max_size - len(self._free),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+_cache = None
+_lock = threading.Lock()
+
+def get_answer_cache() -> SemanticAnswerCache:
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = SemanticAnswerCache(
+                max_size=settings.ANSWER_CACHE_SIZE,
+                threshold=settings.ANSWER_CACHE_THRESHOLD,
+                ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+            )
+    return _cache
+
+def invalidate_scripture_answers(scripture_id: str):
+    """Write-path hook: forget answers grounded in a scripture that changed or was deleted."""
+    if _cache is not None:
+        removed = _cache.invalidate_scripture(scripture_id)
+        if removed:
+            log_event("answer_cache.invalidated", scripture=scripture_id, answers=removed)
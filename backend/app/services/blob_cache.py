@@ -0,0 +1,314 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from app.core.config import settings
+
+_STREAM_CHUNK = 256 * 1024
+
+
+class CachedFile:
+    """A file on local disk plus the validators used for conditional and range requests.
+
+    `file`, when set, is a handle opened while the cache still held the entry; serving
+    from it is safe even if the entry is evicted or re-downloaded in the meantime.
+    """
+
+    def __init__(self, path: str, size: int, etag: str, last_modified: float, file=None):
+        self.path = path
+        self.size = size
+        self.etag = etag                    # quoted, e.g. '"abc"'
+        self.last_modified = last_modified  # unix seconds
+        self.file = file
+
+    def opened(self, file) -> "CachedFile":
+        return CachedFile(self.path, self.size, self.etag, self.last_modified, file)
+
+
+class BlobDiskCache:
+    """Bounded LRU cache of Storage blobs on local disk.
+
+    Each blob is stored as `<sha1(storage_path)>.bin` with a `.json` sidecar holding its
+    size, ETag and update time, so the cache survives restarts. Entries are revalidated
+    against Storage (one metadata request) at most every `revalidate_seconds`; a changed
+    blob is downloaded again. Least recently used files are deleted once the total size
+    exceeds `max_bytes`.
+
+    `get` returns the entry with its file already open, so an eviction or re-download
+    that unlinks or replaces the path afterwards can't pull the file from under a response.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, revalidate_seconds: float = 300):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self._entries = OrderedDict()   # storage_path -> (CachedFile, checked_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}            # storage_path -> [Lock, users], so one download per blob
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _paths(self, storage_path: str):
+        name = hashlib.sha1(storage_path.encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, name)
+        return base + ".bin", base + ".json"
+
+    def _scan(self):
+        """Re-register files left by a previous process, oldest access first."""
+        found = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    meta = json.load(f)
+                data_path, _ = self._paths(meta["storage_path"])
+                found.append((os.path.getatime(data_path), meta, data_path))
+            except (OSError, ValueError, KeyError):
+                continue
+        for _, meta, data_path in sorted(found, key=lambda item: item[0]):
+            entry = CachedFile(data_path, meta["size"], meta["etag"], meta["last_modified"])
+            self._entries[meta["storage_path"]] = (entry, 0.0)  # revalidate on first use
+            self._bytes += entry.size
+
+    @contextmanager
+    def _key_lock(self, storage_path: str):
+        with self._lock:
+            slot = self._key_locks.setdefault(storage_path, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    del self._key_locks[storage_path]
+
+    def _open(self, entry: CachedFile):
+        # Caller holds _lock, so the entry can't be evicted between the check and the open
+        try:
+            return entry.opened(open(entry.path, "rb"))
+        except OSError:
+            return None
+
+    def get(self, bucket, storage_path: str):
+        """Return a CachedFile for the blob, downloading it if needed, or None if it doesn't exist.
+
+        Blocking (Storage I/O); call from a thread.
+        """
+        with self._key_lock(storage_path):
+            with self._lock:
+                cached = self._entries.get(storage_path)
+                if cached is not None:
+                    self._entries.move_to_end(storage_path)
+                    entry, checked_at = cached
+                    if time.monotonic() - checked_at < self.revalidate_seconds:
+                        opened = self._open(entry)
+                        if opened is not None:
+                            self.hits += 1
+                            return opened
+
+
+            blob = bucket.get_blob(storage_path)  # metadata only; None when missing
+            if blob is None:
+                self.evict(storage_path)
+                return None
+            etag = f'"{blob.etag or blob.generation}"'
+            if cached is not None and cached[0].etag == etag:
+                with self._lock:
+                    opened = self._open(cached[0]) if storage_path in self._entries else None
+                    if opened is not None:
+                        self.hits += 1
+                        self._entries[storage_path] = (cached[0], time.monotonic())
+                        return opened
+
+            with self._lock:
+                self.misses += 1
+            data_path, meta_path = self._paths(storage_path)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".part")
+            os.close(fd)
+            try:
+                blob.download_to_filename(tmp)
+                os.replace(tmp, data_path)
+            except Exception:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            size = os.path.getsize(data_path)
+            last_modified = blob.updated.timestamp() if blob.updated else time.time()
+            with open(meta_path, "w") as f:
+                json.dump({"storage_path": storage_path, "size": size, "etag": etag,
+                           "last_modified": last_modified}, f)
+
+            entry = CachedFile(data_path, size, etag, last_modified)
+            with self._lock:
+                old = self._entries.pop(storage_path, None)
+                if old is not None:
+                    self._bytes -= old[0].size
+                self._entries[storage_path] = (entry, time.monotonic())
+                self._bytes += size
+                self._evict_over_budget(keep=storage_path)
+                return entry.opened(open(data_path, "rb"))
+
+    def _evict_over_budget(self, keep: str):
+        # Caller holds _lock. The newest entry is kept even if it alone exceeds the budget.
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            storage_path = next(iter(self._entries))
+            if storage_path == keep:
+                break
+            self._remove(storage_path)
+            self.evictions += 1
+
+    def _remove(self, storage_path: str):
+        entry, _ = self._entries.pop(storage_path)
+        self._bytes -= entry.size
+        # Unlinking is safe under an in-flight response: its handle was opened in get()
+        for path in self._paths(storage_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def evict(self, storage_path: str):
+        """Write-path hook: drop a blob that was replaced or deleted."""
+        with self._lock:
+            if storage_path in self._entries:
+                self._remove(storage_path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "files": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+_cache = None
+_lock = threading.Lock()
+
+def get_blob_cache() -> BlobDiskCache:
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = BlobDiskCache(
+                settings.DOWNLOAD_CACHE_DIR or os.path.join(tempfile.gettempdir(), "scripture_cache"),
+                max_bytes=settings.DOWNLOAD_CACHE_MAX_BYTES,
+                revalidate_seconds=settings.DOWNLOAD_CACHE_REVALIDATE_SECONDS,
+            )
+    return _cache
+
+def evict_blob(storage_path: str):
+    if _cache is not None and storage_path:
+        _cache.evict(storage_path)
+
+
+# ─── HTTP serving ─────────────────────────────────────────────────
+def parse_range(header: str, size: int):
+    """Parse a single `bytes=` range into an inclusive (start, end).
+
+    Returns None to serve the whole file (no, malformed or multi-range header) and
+    raises ValueError when the range can't be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_s, sep, end_s = header[len("bytes="):].strip().partition("-")
+    if not sep or not (start_s + end_s).isdigit():
+        return None
+    if not start_s:
+        suffix = int(end_s)
+        if suffix == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - suffix), size - 1
+    start = int(start_s)
+    if end_s and int(end_s) < start:
+        return None
+    if start >= size:
+        raise ValueError("range starts past the end of the file")
+    end = int(end_s) if end_s else size - 1
+    return start, min(end, size - 1)
+
+def _not_modified(request: Request, entry: CachedFile) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return entry.etag in tags or "*" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(entry.last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+async def _iter_file(file, start: int, length: int):
+    import anyio
+    try:
+        f = anyio.wrap_file(file)
+        await f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = await f.read(min(_STREAM_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+def file_response(request: Request, entry: CachedFile, media_type: str, filename: str) -> Response:
+    """Serve a local file with ETag/Last-Modified, 304s and single byte-range 206s.
+
+    The body is read from `entry.file` (opened here if the entry has none), which is
+    closed once the body is sent or no body is needed.
+    """
+    headers = {
+        "ETag": entry.etag,
+        "Last-Modified": formatdate(entry.last_modified, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "public, max-age=3600",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+    file = entry.file or open(entry.path, "rb")
+    if _not_modified(request, entry):
+        file.close()
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # A stale If-Range means the client's partial copy is outdated: send everything
+    if range_header and if_range and if_range != entry.etag and if_range != headers["Last-Modified"]:
+        range_header = None
+    try:
+        byte_range = parse_range(range_header, entry.size)
+    except ValueError:
+        file.close()
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{entry.size}"})
+
+    if byte_range is None:
+        headers["Content-Length"] = str(entry.size)
+        return StreamingResponse(_iter_file(file, 0, entry.size), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    length = end - start + 1
+    headers["Content-Range"] = f"bytes {start}-{end}/{entry.size}"
+    headers["Content-Length"] = str(length)
+    return StreamingResponse(_iter_file(file, start, length), status_code=206,
+                             media_type=media_type, headers=headers)
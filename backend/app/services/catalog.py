@@ -0,0 +1,155 @@
+import hashlib
+import json
+import threading
+import time
+from fastapi import Request, Response
+from app.core.config import settings
+
+METADATA_FIELDS = ("title", "language", "author")
+UNKNOWN_RETRY_SECONDS = 60   # how long a scriptureId with no document is not looked up again
+
+
+def _json_default(value):
+    # Firestore timestamps are datetimes; serialise them the way the routes always have
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+class ScriptureCatalog:
+    """Pre-serialised listings of the `scriptures` collection, refreshed at most once per TTL.
+
+    One collection read builds both views (public: newest first, admin: everything) and
+    the scriptureId → metadata map that chunk search results are joined against.
+    Each view is stored as its final JSON bytes plus an ETag, so a warm hit costs no
+    Firestore reads and no serialisation. Write paths call `invalidate()`; scriptures
+    added from outside the API (admin/ingest.py) are picked up by `metadata_for`.
+    """
+
+    VIEWS = ("public", "admin")
+
+    def __init__(self, ttl_seconds: float = 300):
+        self.ttl = ttl_seconds
+        self._views = {}        # view -> (body, etag)
+        self._metadata = {}     # scriptureId -> {title, language, author}
+        self._unknown = {}      # scriptureId with no document -> monotonic time to retry
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self, db) -> dict:
+        docs = []
+        for doc in db.collection("scriptures").stream():
+            data = doc.to_dict()
+            data["id"] = doc.id
+            docs.append(data)
+
+        # Same shape as the old `order_by("addedAt", DESCENDING)` query: undated docs are left out
+        public = sorted((d for d in docs if d.get("addedAt")), key=lambda d: d["addedAt"], reverse=True)
+        views = {}
+        for view, scriptures in (("public", public), ("admin", docs)):
+            body = json.dumps({"scriptures": scriptures}, default=_json_default, ensure_ascii=False).encode("utf-8")
+            views[view] = (body, f'"{hashlib.sha1(body).hexdigest()}"')
+        metadata = {d["id"]: {k: d.get(k, "") for k in METADATA_FIELDS} for d in docs}
+        return views, metadata
+
+    def _current(self, db):
+        """(views, metadata), reloading from Firestore if stale or invalidated."""
+        with self._lock:
+            if self._views and time.monotonic() - self._loaded_at < self.ttl:
+                self.hits += 1
+                return self._views, self._metadata
+            self.misses += 1
+            generation = self._generation
+
+        # Load outside the lock; concurrent misses may both read, which is harmless
+        views, metadata = self._load(db)
+        with self._lock:
+            # An invalidation during the load means this snapshot may already be stale
+            if generation == self._generation:
+                self._views, self._metadata = views, metadata
+                self._loaded_at = time.monotonic()
+        return views, metadata
+
+    def get(self, db, view: str):
+        """Return (body, etag) for a listing view."""
+        return self._current(db)[0][view]
+
+    def metadata(self, db) -> dict:
+        """scriptureId → {title, language, author} for every scripture."""
+        return self._current(db)[1]
+
+    def metadata_for(self, db, scripture_ids) -> dict:
+        """Like `metadata`, but fetches any of `scripture_ids` the cached map is missing.
+
+        A new ingest is searchable before the catalog TTL expires; instead of citing its
+        chunks as unknown, read just those scripture documents and add them to the map.
+        IDs with no document are not looked up again for UNKNOWN_RETRY_SECONDS.
+        """
+        metadata = self.metadata(db)
+        now = time.monotonic()
+        with self._lock:
+            missing = [sid for sid in set(scripture_ids)
+                       if sid and sid not in metadata and self._unknown.get(sid, 0) <= now]
+            for sid in missing:
+                self._unknown[sid] = now + UNKNOWN_RETRY_SECONDS
+        if not missing:
+            return metadata
+
+        refs = [db.collection("scriptures").document(sid) for sid in missing]
+        found = {}
+        for doc in db.get_all(refs):
+            if doc.exists:
+                data = doc.to_dict() or {}
+                found[doc.id] = {k: data.get(k, "") for k in METADATA_FIELDS}
+        if not found:
+            return metadata
+        with self._lock:
+            for sid in found:
+                self._unknown.pop(sid, None)
+            # Copy rather than mutate: callers may be holding the previous map
+            self._metadata = {**self._metadata, **found}
+            # The listings don't have the new scripture either; rebuild them on next read
+            self._views = {}
+            return {**metadata, **found}
+
+    def invalidate(self):
+        with self._lock:
+            self._views = {}
+            self._metadata = {}
+            self._generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "loaded": bool(self._views),
+                "age_seconds": time.monotonic() - self._loaded_at if self._views else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+_catalog = None
+_lock = threading.Lock()
+
+def get_scripture_catalog() -> ScriptureCatalog:
+    global _catalog
+    with _lock:
+        if _catalog is None:
+            _catalog = ScriptureCatalog(ttl_seconds=settings.CATALOG_CACHE_TTL_SECONDS)
+    return _catalog
+
+def invalidate_catalog():
+    """Write-path hook: the next listing re-reads the `scriptures` collection."""
+    if _catalog is not None:
+        _catalog.invalidate()
+
+def etag_response(request: Request, body: bytes, etag: str, cache_control: str = "no-cache") -> Response:
+    """Serve pre-serialised JSON, or an empty 304 when the client already has this ETag."""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,109 @@
+import logging
+import threading
+from firebase_admin import firestore
+from app.core.config import settings
+from app.core.log import log_event
+from app.db.firestore import utc_now
+
+JOBS_COLLECTION = "deletion_jobs"
+_running = set()        # job ids being worked on in this process
+_running_lock = threading.Lock()
+
+
+def job_id(uid: str, conv_id: str) -> str:
+    return f"{uid}_{conv_id}"
+
+
+def conversation_ref(db, uid: str, conv_id: str):
+    return db.collection("users").document(uid).collection("conversations").document(conv_id)
+
+
+def start_conversation_deletion(db, uid: str, conv_id: str):
+    """Hide the conversation and record a pending job. Cheap: one read, two writes.
+
+    Calling it again for a conversation that is already being deleted only marks the
+    job running again (with a fresh attempt budget); recorded progress is kept, so a
+    client retry is harmless.
+    """
+    job_ref = db.collection(JOBS_COLLECTION).document(job_id(uid, conv_id))
+    fields = {"status": "running", "attempts": 0, "updatedAt": utc_now()}
+    if not job_ref.get().exists:
+        fields.update({"uid": uid, "convId": conv_id, "deletedMessages": 0, "startedAt": utc_now()})
+    batch = db.batch()
+    batch.update(conversation_ref(db, uid, conv_id), {"deleting": True})
+    batch.set(job_ref, fields, merge=True)
+    batch.commit()
+
+
+def delete_conversation_job(db, uid: str, conv_id: str):
+    """Delete every message of a conversation in pages, then the conversation itself.
+
+    Each page's deletes go through a BulkWriter (parallel, with its own retries) and
+    are flushed before the next page is read, so the loop always sees the remainder.
+    Deletes are idempotent: a crashed or repeated job simply picks up what is left.
+    Chat writes check the `deleting` flag inside a transaction, so no new message can
+    appear behind the last page once the job has started.
+    Progress is recorded on `deletion_jobs/{uid}_{convId}`.
+    """
+    key = job_id(uid, conv_id)
+    with _running_lock:
+        if key in _running:
+            return
+        _running.add(key)
+
+    job_ref = db.collection(JOBS_COLLECTION).document(key)
+    conv_ref = conversation_ref(db, uid, conv_id)
+    messages_ref = conv_ref.collection("messages")
+    page_size = settings.DELETE_PAGE_SIZE
+    deleted = 0
+    previous_page = set()
+    try:
+        deleted = (job_ref.get().to_dict() or {}).get("deletedMessages", 0)
+        job_ref.update({"attempts": firestore.Increment(1), "updatedAt": utc_now()})
+        while True:
+            # Keys only — message bodies are never needed to delete them
+            page = list(messages_ref.select([]).limit(page_size).stream())
+            if not page:
+                break
+            ids = {doc.id for doc in page}
+            if ids & previous_page:
+                raise RuntimeError("messages were not removed by the previous page's writes")
+            previous_page = ids
+
+            writer = db.bulk_writer()
+            for doc in page:
+                writer.delete(doc.reference)
+            writer.close()  # flushes and waits for every write
+
+            deleted += len(page)
+            job_ref.update({"deletedMessages": deleted, "updatedAt": utc_now()})
+
+        conv_ref.delete()
+        job_ref.update({"status": "done", "deletedMessages": deleted, "updatedAt": utc_now()})
+        log_event("delete.done", conversation=conv_id, messages=deleted)
+    except Exception as e:
+        log_event("delete.failed", logging.ERROR, conversation=conv_id, messages=deleted, error=str(e))
+        try:
+            job_ref.update({"status": "failed", "error": str(e), "deletedMessages": deleted, "updatedAt": utc_now()})
+        except Exception:
+            pass
+    finally:
+        with _running_lock:
+            _running.discard(key)
+
+
+def resume_conversation_deletions(db):
+    """Pick up jobs left running or failed by a previous process (startup hook).
+
+    A job that has already been tried DELETE_MAX_ATTEMPTS times is marked `abandoned`
+    instead, so a permanently failing one is not retried on every start.
+    """
+    jobs = db.collection(JOBS_COLLECTION).where("status", "in", ["running", "failed"]).stream()
+    for job in jobs:
+        data = job.to_dict()
+        if data.get("attempts", 0) >= settings.DELETE_MAX_ATTEMPTS:
+            log_event("delete.abandoned", logging.ERROR, conversation=data["convId"], attempts=data["attempts"])
+            job.reference.update({"status": "abandoned", "updatedAt": utc_now()})
+            continue
+        log_event("delete.resumed", conversation=data["convId"])
+        delete_conversation_job(db, data["uid"], data["convId"])
@@ -1,13 +1,343 @@
+import asyncio
+import logging
 import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from sentence_transformers import SentenceTransformer
+from app.core.config import settings
+from app.core.log import log_event
 
 _model = None
 _lock = threading.Lock()
+# Separate from _lock so cache/batcher lookups never wait on a model load
+_singleton_lock = threading.Lock()
+
+EMBED_MODEL = 'all-mpnet-base-v2'
+EMBED_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+PARITY_SENTENCES = [
+    "What does the Bhagavad Gita say about karma?",
+    "Who was Nachiketa and what did he ask Yama?",
+    "Chapter 2 Verse 47",
+    "You have a right to perform your prescribed duties, but not to the fruits of your actions.",
+    "Explain the difference between Atman and Brahman.",
+]
+
+def load_model(backend: str = "torch"):
+    """Load the encoder on the requested CPU backend.
+
+    torch       eager PyTorch (reference)
+    torch-int8  PyTorch with nn.Linear layers dynamically quantised to int8
+    onnx        ONNX Runtime export (needs `sentence-transformers[onnx]`)
+    onnx-int8   ONNX Runtime with the int8-quantised export (EMBED_ONNX_INT8_FILE)
+    """
+    if backend not in EMBED_BACKENDS:
+        raise ValueError(f"EMBED_BACKEND must be one of {EMBED_BACKENDS}")
+    # all-mpnet-base-v2 naturally outputs 768-D vectors
+    if backend == "onnx":
+        return SentenceTransformer(EMBED_MODEL, backend="onnx")
+    if backend == "onnx-int8":
+        return SentenceTransformer(EMBED_MODEL, backend="onnx",
+                                   model_kwargs={"file_name": settings.EMBED_ONNX_INT8_FILE})
+    model = SentenceTransformer(EMBED_MODEL)
+    if backend == "torch-int8":
+        import torch
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+def check_parity(model, reference=None, texts: list[str] = PARITY_SENTENCES) -> float:
+    """Minimum cosine similarity between `model` and the eager PyTorch reference on `texts`."""
+    reference = reference or load_model("torch")
+    a = np.asarray(model.encode(texts), dtype=np.float32)
+    b = np.asarray(reference.encode(texts), dtype=np.float32)
+    cos = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    return float(cos.min())
+
+def loaded_embedding_model():
+    """The model if it has finished loading, else None. Never blocks or triggers a load."""
+    return _model
 
 def get_embedding_model():
     global _model
     with _lock:
         if _model is None:
-            # all-mpnet-base-v2 naturally outputs 768-D vectors
-            _model = SentenceTransformer('all-mpnet-base-v2')
+            backend = settings.EMBED_BACKEND
+            try:
+                model = load_model(backend)
+                if backend != "torch" and settings.EMBED_PARITY_CHECK:
+                    parity = check_parity(model)
+                    log_event("embedding.parity", backend=backend, min_cosine=round(parity, 5))
+                    if parity < settings.EMBED_PARITY_TOLERANCE:
+                        raise ValueError(f"parity {parity:.5f} below {settings.EMBED_PARITY_TOLERANCE}")
+            except Exception as e:
+                if backend == "torch":
+                    raise
+                log_event("embedding.fallback", logging.WARNING, backend=backend, error=str(e))
+                model = load_model("torch")
+            _model = model
     return _model
+
+
+class EmbeddingBatcher:
+    """Collects concurrent query texts into micro-batches and encodes them off the event loop."""
+
+    def __init__(self, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        # One encoder thread: torch already parallelises a batch across cores
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self._queue = None
+        self._worker = None
+        self.batches = 0
+        self.texts = 0
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def embed(self, text: str) -> list[float]:
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [text for text, _ in batch]
+            self.batches += 1
+            self.texts += len(texts)
+            try:
+                vectors = await loop.run_in_executor(self._executor, _encode_batch, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    async def embed_many(self, texts: list[str]) -> list[list[float]]:
+        """Encode an already-collected batch in one call, on the same encoder thread."""
+        loop = asyncio.get_running_loop()
+        self.batches += 1
+        self.texts += len(texts)
+        return await loop.run_in_executor(self._executor, _encode_batch, texts)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": self.texts / self.batches if self.batches else 0.0,
+        }
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._executor.shutdown(wait=False)
+
+
+def _encode_batch(texts: list[str]) -> list[list[float]]:
+    embeddings = get_embedding_model().encode(texts, batch_size=len(texts))
+    return [[float(v) for v in e] for e in embeddings]
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive cache key for a query."""
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    """Thread-safe LRU of query embeddings with TTL expiry, stored as float32 arrays."""
+
+    def __init__(self, max_size: int = 2048, ttl_seconds: float = 3600):
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, vector)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, text: str):
+        key = normalize_query(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return None
+
+    def put(self, text: str, vector):
+        key = normalize_query(text)
+        vec = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, vec)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+_cache = None
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _cache
+    with _singleton_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(
+                max_size=settings.EMBED_CACHE_SIZE,
+                ttl_seconds=settings.EMBED_CACHE_TTL_SECONDS,
+            )
+    return _cache
+
+
+_batcher = None
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    global _batcher
+    with _singleton_lock:
+        if _batcher is None:
+            _batcher = EmbeddingBatcher(
+                max_batch_size=settings.EMBED_MAX_BATCH_SIZE,
+                max_wait_ms=settings.EMBED_MAX_WAIT_MS,
+            )
+    return _batcher
+
+async def close_embedding_batcher():
+    global _batcher
+    if _batcher is not None:
+        await _batcher.close()
+        _batcher = None
+
+async def embed_query(text: str) -> list[float]:
+    """Embed a single query without blocking the event loop; concurrent calls share a batch."""
+    cache = get_embedding_cache()
+    cached = cache.get(text)
+    if cached is not None:
+        return cached.tolist()
+    vector = await get_embedding_batcher().embed(text)
+    cache.put(text, vector)
+    return vector
+
+
+async def embed_queries(texts: list[str]) -> list[list[float]]:
+    """Embed many queries at once: cache hits are reused, the misses share one encode call."""
+    cache = get_embedding_cache()
+    vectors = [None] * len(texts)
+    missing = {}   # text -> positions, so duplicates are encoded once
+    for i, text in enumerate(texts):
+        cached = cache.get(text)
+        if cached is not None:
+            vectors[i] = cached.tolist()
+        else:
+            missing.setdefault(text, []).append(i)
+    if missing:
+        encoded = await get_embedding_batcher().embed_many(list(missing))
+        for (text, positions), vector in zip(missing.items(), encoded):
+            cache.put(text, vector)
+            for i in positions:
+                vectors[i] = vector
+    return vectors
+
+
+def _benchmark_backend(backend: str, runs: int = 20) -> dict:
+    """Latency, throughput, RSS and parity for one backend (run in a fresh process)."""
+    import resource
+    import statistics
+
+    started = time.perf_counter()
+    model = load_model(backend)
+    load_seconds = time.perf_counter() - started
+    model.encode(PARITY_SENTENCES)  # warm-up
+
+    latencies = []
+    for i in range(runs):
+        t0 = time.perf_counter()
+        model.encode(PARITY_SENTENCES[i % len(PARITY_SENTENCES)])
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    batch = PARITY_SENTENCES * 13  # 65 texts
+    t0 = time.perf_counter()
+    model.encode(batch, batch_size=32)
+    throughput = len(batch) / (time.perf_counter() - t0)
+
+    return {
+        "backend": backend,
+        "load_s": round(load_seconds, 2),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(sorted(latencies)[int(0.95 * (len(latencies) - 1))], 2),
+        "throughput_per_s": round(throughput, 1),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "parity_min_cosine": round(check_parity(model), 5) if backend != "torch" else 1.0,
+    }
+
+
+if __name__ == "__main__":
+    # Benchmark every backend in its own process so RSS numbers don't mix:
+    #   python -m app.services.embedding [backend ...]
+    import json
+    import subprocess
+    import sys
+
+    if len(sys.argv) == 3 and sys.argv[1] == "--one":
+        result = _benchmark_backend(sys.argv[2])
+        print(json.dumps(result))
+        sys.exit(0 if result["parity_min_cosine"] >= settings.EMBED_PARITY_TOLERANCE else 1)
+
+    # Non-zero exit if any backend fails to load or misses EMBED_PARITY_TOLERANCE (CI gate)
+    failed = False
+    for backend in sys.argv[1:] or EMBED_BACKENDS:
+        proc = subprocess.run(
+            [sys.executable, "-m", "app.services.embedding", "--one", backend],
+            capture_output=True, text=True
+        )
+        lines = proc.stdout.strip().splitlines()
+        if lines and lines[-1].startswith("{"):
+            print(lines[-1])
+            failed = failed or proc.returncode != 0
+        else:
+            failed = True
+            print(json.dumps({"backend": backend, "error": proc.stderr.strip().splitlines()[-1:]}))
+    sys.exit(1 if failed else 0)
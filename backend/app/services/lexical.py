@@ -0,0 +1,264 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+import numpy as np
+from app.core.log import log_event
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset("""
+a an and are as at be but by did do does for from had has have he her his how i in is it its
+me my of on or our she so that the their them then there these they this to was we were what
+when where which who whom why will with you your about into than also can tell say says said
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased word tokens (any script, numbers kept, English stopwords dropped)."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """Compact BM25 inverted index over chunk text.
+
+    Postings are stored as three flat arrays (offsets, doc rows, precomputed BM25 term
+    weights), so a query is one slice-and-add per query term over a dense score vector.
+    """
+
+    def __init__(self, vocab: dict, offsets: np.ndarray, postings: np.ndarray, weights: np.ndarray, docs: list):
+        self.vocab = vocab          # term -> term id
+        self.offsets = offsets      # term id -> start in postings (len = terms + 1)
+        self.postings = postings    # doc rows, int32
+        self.weights = weights      # BM25 weight of the term in that doc, float32
+        self.docs = docs            # row -> chunk fields (text, scriptureId, chunkIndex, metadata)
+        self.built_at = time.time()
+
+    def __len__(self):
+        return len(self.docs)
+
+    @classmethod
+    def build(cls, docs, k1: float = 1.5, b: float = 0.75) -> "LexicalIndex":
+        """Build from an iterable of chunk field dicts."""
+        stored = []
+        term_docs = {}   # term -> {row: tf}
+        lengths = []
+        for data in docs:
+            row = len(stored)
+            stored.append({k: data[k] for k in ("id", "text", "scriptureId", "chunkIndex", "metadata") if k in data})
+            tokens = tokenize(data.get("text", ""))
+            lengths.append(len(tokens))
+            for token in tokens:
+                tfs = term_docs.setdefault(token, {})
+                tfs[row] = tfs.get(row, 0) + 1
+
+        n = len(stored)
+        lengths = np.asarray(lengths, dtype=np.float32)
+        avgdl = float(lengths.mean()) if n else 1.0
+        vocab = {}
+        offsets = [0]
+        postings = []
+        weights = []
+        for term, tfs in term_docs.items():
+            vocab[term] = len(vocab)
+            rows = np.fromiter(tfs.keys(), dtype=np.int32, count=len(tfs))
+            tf = np.fromiter(tfs.values(), dtype=np.float32, count=len(tfs))
+            idf = np.log(1 + (n - len(tfs) + 0.5) / (len(tfs) + 0.5))
+            norm = k1 * (1 - b + b * lengths[rows] / avgdl)
+            postings.append(rows)
+            weights.append((idf * tf * (k1 + 1) / (tf + norm)).astype(np.float32))
+            offsets.append(offsets[-1] + len(rows))
+
+        return cls(
+            vocab,
+            np.asarray(offsets, dtype=np.int64),
+            np.concatenate(postings) if postings else np.zeros(0, dtype=np.int32),
+            np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32),
+            stored,
+        )
+
+    def search(self, query: str, limit: int = 20) -> list[dict]:
+        """Top `limit` chunks by BM25, each with a `lexical_score`."""
+        scores = np.zeros(len(self.docs), dtype=np.float32)
+        matched = False
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            # Rows within one posting list are unique, so plain fancy-index add is safe
+            scores[self.postings[start:end]] += self.weights[start:end]
+            matched = True
+        if not matched:
+            return []
+
+        k = min(limit, int((scores > 0).sum()))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for row in top:
+            data = dict(self.docs[row])
+            data["lexical_score"] = float(scores[row])
+            results.append(data)
+        return results
+
+    # ─── On-disk format ──────────────────────────────────────────
+    def save(self, path: str):
+        """Write the index as one compressed .npz (arrays + JSON vocab/doc store)."""
+        terms = sorted(self.vocab, key=self.vocab.get)
+        meta = json.dumps({"terms": terms, "docs": self.docs, "built_at": self.built_at}, default=str)
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(tmp, offsets=self.offsets, postings=self.postings,
+                            weights=self.weights, meta=np.frombuffer(meta.encode("utf-8"), dtype=np.uint8))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        with np.load(path) as data:
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            index = cls(
+                {term: i for i, term in enumerate(meta["terms"])},
+                data["offsets"], data["postings"], data["weights"], meta["docs"],
+            )
+        index.built_at = meta.get("built_at", os.path.getmtime(path))
+        return index
+
+
+def reciprocal_rank_fusion(rankings: list[list[dict]], limit: int, k: int = 60) -> list[dict]:
+    """Fuse ranked chunk lists with RRF (sum of 1 / (k + rank)), merging fields per chunk."""
+    fused = {}
+    for ranking in rankings:
+        for rank, data in enumerate(ranking):
+            key = (data.get("scriptureId", ""), data.get("chunkIndex", 0))
+            entry = fused.setdefault(key, {"data": {}, "score": 0.0})
+            entry["data"].update(data)
+            entry["score"] += 1.0 / (k + rank + 1)
+    ordered = sorted(fused.values(), key=lambda e: e["score"], reverse=True)[:limit]
+    results = []
+    for entry in ordered:
+        entry["data"]["rrf_score"] = entry["score"]
+        results.append(entry["data"])
+    return results
+
+
+class LexicalRetriever:
+    """Holds the current LexicalIndex and keeps it in sync with `scripture_chunks`.
+
+    With LOCAL_VECTOR_INDEX, chunk changes come from the vector index's snapshot
+    listener (shared, so nothing extra is read) and the compact index is rebuilt in
+    memory at most every `rebuild_seconds` while changes keep coming. Without it, a
+    listener of our own would download every embedding, so instead the text fields are
+    re-read with a projected query every `refresh_seconds`. Either way a saved index
+    serves queries from startup, and a fresh enough one skips the first re-read.
+    """
+
+    FIELDS = ["text", "scriptureId", "chunkIndex", "metadata"]
+
+    def __init__(self, path: str, rebuild_seconds: float, refresh_seconds: float):
+        self.path = path
+        self.rebuild_seconds = rebuild_seconds
+        self.refresh_seconds = refresh_seconds
+        self.index = None
+        self._docs = {}      # chunk doc id -> indexed fields (listener mode)
+        self._docs_lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def apply_changes(self, upserts: list, removals: list):
+        """Listener callback: (doc id, fields) pairs to add or replace, doc ids to drop."""
+        with self._docs_lock:
+            for doc_id, data in upserts:
+                self._docs[doc_id] = {k: data[k] for k in self.FIELDS if k in data}
+            for doc_id in removals:
+                self._docs.pop(doc_id, None)
+        self._dirty.set()
+
+    def _install(self, index: LexicalIndex, started: float):
+        log_event("lexical.built", chunks=len(index), seconds=round(time.perf_counter() - started, 1))
+        if self.path:
+            index.save(self.path)
+        self.index = index
+
+    def _build_from_docs(self):
+        started = time.perf_counter()
+        with self._docs_lock:
+            docs = [{**data, "id": doc_id} for doc_id, data in self._docs.items()]
+        self._install(LexicalIndex.build(docs), started)
+
+    def _build_from_firestore(self, db):
+        started = time.perf_counter()
+        # Projected: text fields only, never the embeddings
+        docs = db.collection("scripture_chunks").select(self.FIELDS).stream()
+        self._install(LexicalIndex.build({**doc.to_dict(), "id": doc.id} for doc in docs), started)
+
+    def _load_saved(self):
+        if self.path and os.path.exists(self.path):
+            try:
+                self.index = LexicalIndex.load(self.path)
+                log_event("lexical.loaded", chunks=len(self.index), path=self.path)
+            except Exception as e:
+                log_event("lexical.load_failed", logging.WARNING, path=self.path, error=str(e))
+
+    def _run_listener(self):
+        while not self._stop.is_set():
+            if not self._dirty.wait(1.0):
+                continue
+            self._dirty.clear()
+            try:
+                self._build_from_docs()
+            except Exception as e:
+                log_event("lexical.build_failed", logging.ERROR, error=str(e))
+                self._dirty.set()
+            # Debounce: changes in the meantime are folded into the next rebuild
+            self._stop.wait(self.rebuild_seconds)
+
+    def _run_polling(self, db):
+        while not self._stop.is_set():
+            if self.index is None or time.time() - self.index.built_at >= self.refresh_seconds:
+                try:
+                    self._build_from_firestore(db)
+                except Exception as e:
+                    log_event("lexical.build_failed", logging.ERROR, error=str(e))
+            self._stop.wait(min(self.refresh_seconds, 60))
+
+    def _run(self, db, vector_index):
+        self._load_saved()
+        if vector_index is not None:
+            # Replays the chunks already loaded, then streams changes into apply_changes
+            vector_index.add_listener(self.apply_changes)
+            self._run_listener()
+        else:
+            self._run_polling(db)
+
+    def start(self, db, vector_index=None):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(db, vector_index),
+                                            daemon=True, name="lexical-index")
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def search(self, query: str, limit: int = 20) -> list[dict]:
+        index = self.index
+        return index.search(query, limit) if index is not None else []
+
+
+_retriever = None
+_lock = threading.Lock()
+
+def get_lexical_retriever() -> LexicalRetriever:
+    global _retriever
+    with _lock:
+        if _retriever is None:
+            from app.core.config import settings
+            _retriever = LexicalRetriever(
+                settings.LEXICAL_INDEX_PATH,
+                rebuild_seconds=settings.LEXICAL_INDEX_REBUILD_SECONDS,
+                refresh_seconds=settings.LEXICAL_INDEX_REFRESH_SECONDS,
+            )
+    return _retriever
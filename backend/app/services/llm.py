@@ -0,0 +1,501 @@
+import asyncio
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from app.core.config import settings
+from app.core.log import log_event
+from app.services.metrics import LLM_SECONDS, LLM_TTFT_SECONDS, LLM_RETRIES, LLM_TOKENS
+
+if settings.GEMINI_API_KEY:
+    os.environ["GEMINI_API_KEY"] = settings.GEMINI_API_KEY
+
+RETRYABLE_MARKERS = ["429", "rate_limit", "503", "UNAVAILABLE", "RESOURCE_EXHAUSTED", "overloaded"]
+
+
+def is_retryable(error: Exception) -> bool:
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status in (429, 500, 502, 503, 504):
+        return True
+    error_str = str(error)
+    return any(k in error_str for k in RETRYABLE_MARKERS)
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """Exponential backoff with jitter, honouring a provider's retryDelay hint, capped."""
+    delay_match = re.search(r'retryDelay.*?(\d+)', str(error))
+    base = int(delay_match.group(1)) if delay_match else 0.5 * (2 ** attempt)
+    return min(base, settings.LLM_MAX_BACKOFF_SECONDS) * (0.8 + random.random() * 0.4)
+
+
+class CircuitBreaker:
+    """Per-provider breaker driven by the error rate and latency of recent calls.
+
+    closed → open when the window's error rate or median latency crosses its threshold;
+    open → half-open after `cooldown` seconds, letting one probe call through.
+    """
+
+    def __init__(self, window: int = 20, min_samples: int = 5, error_rate: float = 0.5,
+                 latency_seconds: float = 20.0, cooldown: float = 30.0):
+        self.min_samples = min_samples
+        self.error_rate = error_rate
+        self.latency_seconds = latency_seconds
+        self.cooldown = cooldown
+        self._outcomes = deque(maxlen=window)  # (ok, latency)
+        self._state = "closed"
+        self._opened_at = 0.0
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == "closed":
+                return True
+            now = time.monotonic()
+            if self._state == "open" and now - self._opened_at >= self.cooldown:
+                self._state = "half_open"
+                self._probe_started = 0.0
+            # A probe that never reported back (e.g. not used) is replaced after a cooldown
+            if self._state == "half_open" and now - self._probe_started >= self.cooldown:
+                self._probe_started = now
+                return True
+            return False
+
+    def _trip(self):
+        self._state = "open"
+        self._opened_at = time.monotonic()
+
+    def record(self, ok: bool, latency: float):
+        with self._lock:
+            self._outcomes.append((ok, latency))
+            if self._state == "half_open":
+                if ok:
+                    self._state = "closed"
+                    self._outcomes.clear()
+                else:
+                    self._trip()
+                return
+            if len(self._outcomes) < self.min_samples:
+                return
+            failures = sum(1 for ok_, _ in self._outcomes if not ok_)
+            median = self._percentile(0.5)
+            if failures / len(self._outcomes) >= self.error_rate or median >= self.latency_seconds:
+                self._trip()
+
+    def _percentile(self, p: float):
+        latencies = sorted(lat for ok, lat in self._outcomes if ok)
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+    def latency_percentile(self, p: float):
+        """Latency percentile of recent successful calls, or None with too little data."""
+        with self._lock:
+            if sum(1 for ok, _ in self._outcomes if ok) < self.min_samples:
+                return None
+            return self._percentile(p)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = len(self._outcomes)
+            failures = sum(1 for ok, _ in self._outcomes if not ok)
+            return {
+                "state": self._state,
+                "window": total,
+                "error_rate": failures / total if total else 0.0,
+                "p50_latency": self._percentile(0.5),
+                "p95_latency": self._percentile(0.95),
+            }
+
+
+class TokenBucket:
+    """Client-side request quota: `rate_per_minute` tokens per minute, bursting to `capacity`.
+
+    A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.throttled = 0
+
+    def try_acquire(self) -> float:
+        """Take a token and return 0, or return the seconds until one is available."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    async def acquire(self, max_wait: float = 0.0) -> bool:
+        """Take a token, waiting up to `max_wait` seconds for one. False if none came."""
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                with self._lock:
+                    self.throttled += 1
+                return False
+            await asyncio.sleep(wait)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate_per_minute": self.rate * 60,
+                "tokens": self._tokens if self.rate > 0 else None,
+                "throttled": self.throttled,
+            }
+
+
+class QuotaExhausted(RuntimeError):
+    """Raised locally, before any call, when a provider's request quota is used up."""
+
+    def __init__(self, provider: str):
+        super().__init__(f"{provider} rate_limit: local request quota exhausted")
+
+
+class GroqProvider:
+    name = "groq"
+    model = "llama-3.3-70b-versatile"
+
+    def __init__(self):
+        self._client = None
+        self.breaker = make_breaker()
+        self.quota = TokenBucket(settings.GROQ_REQUESTS_PER_MINUTE)
+
+    @property
+    def configured(self) -> bool:
+        return bool(settings.GROQ_API_KEY)
+
+    @property
+    def client(self):
+        # One long-lived client keeps its httpx connection pool and TLS sessions
+        if self._client is None:
+            from groq import AsyncGroq
+            self._client = AsyncGroq(api_key=settings.GROQ_API_KEY)
+        return self._client
+
+    @staticmethod
+    def _record_usage(usage: dict, model: str, reported):
+        usage["model"] = model
+        if reported is not None:
+            usage["prompt_tokens"] = getattr(reported, "prompt_tokens", None)
+            usage["completion_tokens"] = getattr(reported, "completion_tokens", None)
+
+    async def complete(self, system_prompt: str, user_prompt: str, temperature: float, max_tokens: int,
+                       usage: dict = None) -> str:
+        resp = await self.client.chat.completions.create(
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            model=self.model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        if usage is not None:
+            self._record_usage(usage, self.model, getattr(resp, "usage", None))
+        return resp.choices[0].message.content or ""
+
+    async def stream(self, system_prompt: str, user_prompt: str, temperature: float, max_tokens: int,
+                     usage: dict = None):
+        stream = await self.client.chat.completions.create(
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            model=self.model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+        )
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+            # Groq reports usage on the final chunk under x_groq
+            x_groq = getattr(chunk, "x_groq", None)
+            if usage is not None and getattr(x_groq, "usage", None) is not None:
+                self._record_usage(usage, self.model, x_groq.usage)
+        if usage is not None:
+            usage.setdefault("model", self.model)
+
+
+class GeminiProvider:
+    name = "gemini"
+    models = ["gemini-2.5-flash", "gemini-2.0-flash"]
+
+    def __init__(self):
+        self._client = None
+        self.breaker = make_breaker()
+        self.quota = TokenBucket(settings.GEMINI_REQUESTS_PER_MINUTE)
+
+    @property
+    def configured(self) -> bool:
+        # genai.Client() also reads GEMINI_API_KEY/GOOGLE_API_KEY from the environment
+        return True
+
+    @property
+    def client(self):
+        if self._client is None:
+            from google import genai
+            self._client = genai.Client()
+        return self._client
+
+    @staticmethod
+    def _record_usage(usage: dict, model: str, metadata):
+        usage["model"] = model
+        if metadata is not None:
+            usage["prompt_tokens"] = getattr(metadata, "prompt_token_count", None)
+            usage["completion_tokens"] = getattr(metadata, "candidates_token_count", None)
+
+    async def complete(self, system_prompt: str, user_prompt: str, temperature: float, max_tokens: int,
+                       usage: dict = None) -> str:
+        full_prompt = f"{system_prompt}\n\n{user_prompt}"
+        last_error = None
+        for model_name in self.models:
+            try:
+                response = await self.client.aio.models.generate_content(
+                    model=model_name,
+                    contents=full_prompt
+                )
+                if usage is not None:
+                    self._record_usage(usage, model_name, getattr(response, "usage_metadata", None))
+                return response.text or ""
+            except Exception as e:
+                last_error = e
+                if not is_retryable(e):
+                    raise
+                log_event("llm.model_fallback", logging.WARNING, provider=self.name, model=model_name, error=str(e))
+        raise last_error
+
+    async def stream(self, system_prompt: str, user_prompt: str, temperature: float, max_tokens: int,
+                     usage: dict = None):
+        full_prompt = f"{system_prompt}\n\n{user_prompt}"
+        last_error = None
+        for model_name in self.models:
+            started = False
+            try:
+                async for chunk in await self.client.aio.models.generate_content_stream(
+                    model=model_name,
+                    contents=full_prompt
+                ):
+                    if usage is not None:
+                        # Each chunk carries cumulative usage; the last one is the total
+                        self._record_usage(usage, model_name, getattr(chunk, "usage_metadata", None))
+                    if chunk.text:
+                        started = True
+                        yield chunk.text
+                return
+            except Exception as e:
+                if started or not is_retryable(e):
+                    raise
+                last_error = e
+                log_event("llm.model_fallback", logging.WARNING, provider=self.name, model=model_name, error=str(e))
+        raise last_error
+
+
+def make_breaker() -> CircuitBreaker:
+    return CircuitBreaker(
+        error_rate=settings.LLM_BREAKER_ERROR_RATE,
+        latency_seconds=settings.LLM_BREAKER_LATENCY_SECONDS,
+        cooldown=settings.LLM_BREAKER_COOLDOWN_SECONDS,
+    )
+
+
+class ProviderRouter:
+    """Routes completions across providers in priority order (Groq, then Gemini).
+
+    A provider whose breaker is open is skipped without a call, and so is one whose
+    local token bucket is empty (the last provider waits briefly for a token instead),
+    so we never send more requests than the provider's quota allows. Rate limits fail
+    over to the next provider immediately; only the last provider standing is retried
+    with backoff. With hedging on, the fallback is started once the primary has been
+    running longer than its recent latency percentile, and the first answer wins.
+    """
+
+    def __init__(self, providers: list):
+        self.providers = providers
+
+    def _available(self, names=None) -> list:
+        return [
+            p for p in self.providers
+            if p.configured and (names is None or p.name in names) and p.breaker.allow()
+        ]
+
+    @staticmethod
+    def _record(provider, usage: dict, seconds: float, outcome: str, attempt: int,
+                ttft: float = None, **fields):
+        """Metrics and one structured log event per provider call.
+
+        `seconds` is always the whole call; a stream that produced tokens also reports
+        its time to first token (`ttft`) into a histogram of its own.
+        """
+        model = usage.get("model") or getattr(provider, "model", "")
+        LLM_SECONDS.observe(seconds, provider=provider.name, model=model, outcome=outcome)
+        if ttft is not None:
+            LLM_TTFT_SECONDS.observe(ttft, provider=provider.name, model=model)
+            fields["ttft_seconds"] = round(ttft, 3)
+        for kind in ("prompt", "completion"):
+            if usage.get(f"{kind}_tokens"):
+                LLM_TOKENS.inc(usage[f"{kind}_tokens"], provider=provider.name, model=model, kind=kind)
+        log_event("llm.call", logging.INFO if outcome == "ok" else logging.WARNING,
+                  provider=provider.name, model=model, outcome=outcome, attempt=attempt,
+                  seconds=round(seconds, 3), prompt_tokens=usage.get("prompt_tokens"),
+                  completion_tokens=usage.get("completion_tokens"), **fields)
+
+    async def _call(self, provider, system_prompt, user_prompt, temperature, max_tokens,
+                    quota_wait: float = 0.0, attempt: int = 1) -> str:
+        if not await provider.quota.acquire(quota_wait):
+            raise QuotaExhausted(provider.name)
+        usage = {}
+        started = time.monotonic()
+        try:
+            result = await provider.complete(system_prompt, user_prompt, temperature, max_tokens, usage=usage)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            provider.breaker.record(False, time.monotonic() - started)
+            self._record(provider, usage, time.monotonic() - started, "error", attempt, error=str(e))
+            raise
+        provider.breaker.record(True, time.monotonic() - started)
+        self._record(provider, usage, time.monotonic() - started, "ok", attempt)
+        return result
+
+    async def _call_with_retries(self, provider, is_last: bool, *args) -> str:
+        attempts = settings.LLM_MAX_RETRIES if is_last else 1
+        quota_wait = settings.LLM_QUOTA_MAX_WAIT_SECONDS if is_last else 0.0
+        attempt = 0
+        while True:
+            try:
+                return await self._call(provider, *args, quota_wait=quota_wait, attempt=attempt + 1)
+            except Exception as e:
+                attempt += 1
+                if not is_retryable(e) or attempt >= attempts:
+                    raise
+                wait_time = retry_delay(e, attempt - 1)
+                LLM_RETRIES.inc(provider=provider.name)
+                log_event("llm.retry", logging.WARNING, provider=provider.name, attempt=attempt, wait_seconds=round(wait_time, 2))
+                await asyncio.sleep(wait_time)
+
+    async def _hedged(self, primary, fallback, *args) -> str:
+        delay = primary.breaker.latency_percentile(settings.LLM_HEDGE_PERCENTILE)
+        delay = max(delay or 0.0, settings.LLM_HEDGE_MIN_DELAY_SECONDS)
+
+        primary_task = asyncio.create_task(self._call(primary, *args))
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if done and not primary_task.exception():
+            return primary_task.result()
+
+        if not done:
+            log_event("llm.hedge", provider=primary.name, fallback=fallback.name, delay_seconds=round(delay, 2))
+        tasks = {primary_task, asyncio.create_task(self._call_with_retries(fallback, True, *args))}
+        last_error = None
+        try:
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def complete(self, system_prompt: str, user_prompt: str, temperature: float = 0.7,
+                       max_tokens: int = 4096, providers=None, hedge: bool = None) -> str:
+        available = self._available(providers)
+        if not available:
+            raise RuntimeError("No LLM provider available (unconfigured or circuit open)")
+        args = (system_prompt, user_prompt, temperature, max_tokens)
+
+        if hedge is None:
+            hedge = settings.LLM_HEDGE_ENABLED
+        if hedge and len(available) >= 2:
+            return await self._hedged(available[0], available[1], *args)
+
+        last_error = None
+        for i, provider in enumerate(available):
+            try:
+                return await self._call_with_retries(provider, i == len(available) - 1, *args)
+            except Exception as e:
+                last_error = e
+                log_event("llm.failover", logging.WARNING, provider=provider.name, error=str(e))
+        raise last_error
+
+    async def stream(self, system_prompt: str, user_prompt: str, temperature: float = 0.7,
+                     max_tokens: int = 4096, providers=None):
+        """Yield response text as it streams. Failover only happens before the first token."""
+        available = self._available(providers)
+        if not available:
+            raise RuntimeError("No LLM provider available (unconfigured or circuit open)")
+
+        last_error = None
+        for i, provider in enumerate(available):
+            attempts = settings.LLM_MAX_RETRIES if i == len(available) - 1 else 1
+            quota_wait = settings.LLM_QUOTA_MAX_WAIT_SECONDS if i == len(available) - 1 else 0.0
+            for attempt in range(attempts):
+                if not await provider.quota.acquire(quota_wait):
+                    last_error = QuotaExhausted(provider.name)
+                    log_event("llm.failover", logging.WARNING, provider=provider.name, error=str(last_error))
+                    break
+                usage = {}
+                started = time.monotonic()
+                first_token = None
+                try:
+                    async for delta in provider.stream(system_prompt, user_prompt, temperature, max_tokens, usage=usage):
+                        if first_token is None:
+                            first_token = time.monotonic() - started
+                            # Breaker latency for streams is time-to-first-token
+                            provider.breaker.record(True, first_token)
+                        yield delta
+                    self._record(provider, usage, time.monotonic() - started, "ok", attempt + 1,
+                                 ttft=first_token, stream=True)
+                    return
+                except Exception as e:
+                    if first_token is not None:
+                        self._record(provider, usage, time.monotonic() - started, "error", attempt + 1,
+                                     ttft=first_token, stream=True, error=str(e))
+                        raise
+                    provider.breaker.record(False, time.monotonic() - started)
+                    self._record(provider, usage, time.monotonic() - started, "error", attempt + 1, stream=True, error=str(e))
+                    last_error = e
+                    if not is_retryable(e) or attempt == attempts - 1:
+                        log_event("llm.failover", logging.WARNING, provider=provider.name, error=str(e))
+                        break
+                    wait_time = retry_delay(e, attempt)
+                    LLM_RETRIES.inc(provider=provider.name)
+                    log_event("llm.retry", logging.WARNING, provider=provider.name, attempt=attempt + 1, wait_seconds=round(wait_time, 2))
+                    await asyncio.sleep(wait_time)
+        raise last_error
+
+    def stats(self) -> dict:
+        return {p.name: {**p.breaker.stats(), "quota": p.quota.stats()} for p in self.providers}
+
+
+_router = None
+_lock = threading.Lock()
+
+def get_llm_router() -> ProviderRouter:
+    global _router
+    with _lock:
+        if _router is None:
+            _router = ProviderRouter([GroqProvider(), GeminiProvider()])
+    return _router
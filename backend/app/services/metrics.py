@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from app.core.log import log_event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_str(labels: dict) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram, one series per label set."""
+
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}   # label tuple -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                labels = dict(key)
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_label_str({**labels, 'le': bound})} {count}")
+                lines.append(f"{self.name}_bucket{_label_str({**labels, 'le': '+Inf'})} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_str(labels)} {series[-2]}")
+                lines.append(f"{self.name}_count{_label_str(labels)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(dict(key))} {value}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Time spent in each RAG pipeline stage.")
+REQUEST_SECONDS = Histogram("chat_request_seconds", "End-to-end chat request time (to last byte when streamed).")
+LLM_SECONDS = Histogram("llm_request_seconds", "LLM call time per provider and model (to the last token when streamed).")
+LLM_TTFT_SECONDS = Histogram("llm_time_to_first_token_seconds", "Time to the first streamed token per provider and model.")
+LLM_RETRIES = Counter("llm_retries_total", "LLM attempts retried after a transient error.")
+LLM_TOKENS = Counter("llm_tokens_total", "LLM token usage reported by the provider.")
+_METRICS = [STAGE_SECONDS, REQUEST_SECONDS, LLM_SECONDS, LLM_TTFT_SECONDS, LLM_RETRIES, LLM_TOKENS]
+
+
+@contextmanager
+def span(stage: str, **fields):
+    """Time a pipeline stage into rag_stage_seconds{stage} and emit a debug log event.
+
+    Works around both sync and async code (`with span("embed"): await ...`).
+    """
+    started = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        log_event("stage", logging.DEBUG, stage=stage, ms=round(seconds * 1000, 2), **fields)
+
+
+def gauges_from_stats(prefix: str, stats: dict, labels: dict = None) -> list[str]:
+    """Render every numeric leaf of a component's stats() dict as a gauge.
+
+    Nested dicts become a `key` label (e.g. one series per provider); string leaves
+    become an info-style gauge with the value as a label.
+    """
+    labels = labels or {}
+    lines = []
+    for field, value in (stats or {}).items():
+        name = f"{prefix}_{field}"
+        if isinstance(value, dict):
+            if labels:
+                lines += gauges_from_stats(name, value, labels)
+            else:
+                lines += gauges_from_stats(prefix, value, {"key": field})
+        elif isinstance(value, bool):
+            lines.append(f"{name}{_label_str(labels)} {int(value)}")
+        elif isinstance(value, (int, float)):
+            lines.append(f"{name}{_label_str(labels)} {value}")
+        elif isinstance(value, str):
+            lines.append(f"{name}{_label_str({**labels, field: value})} 1")
+    return lines
+
+
+def render_metrics(component_stats: dict) -> str:
+    """Prometheus text exposition: histograms and counters, then gauges from component stats."""
+    lines = []
+    for metric in _METRICS:
+        lines += metric.render()
+    for component, stats in component_stats.items():
+        if stats:
+            lines += gauges_from_stats(f"app_{component}", stats)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,157 @@
+from app.core.config import settings
+from app.core.log import log_event
+
+
+def count_tokens(text: str) -> int:
+    """Fast local token count using the embedding model's (Rust) tokenizer.
+
+    It is not the LLM's own vocabulary, so treat the result as an estimate; falls
+    back to ~4 characters per token until the model has loaded (this runs on the
+    event loop, so it must never wait for, or retry, a model load).
+    """
+    if not text:
+        return 0
+    try:
+        from app.services.embedding import loaded_embedding_model
+        model = loaded_embedding_model()
+        if model is not None:
+            return len(model.tokenizer(text, add_special_tokens=False, verbose=False)["input_ids"])
+    except Exception:
+        pass
+    return len(text) // 4 + 1
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Trim `text` to roughly `max_tokens`, keeping the beginning."""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    keep = int(len(text) * max_tokens / tokens)
+    return text[:keep].rstrip() + " …"
+
+
+def build_prompts(input_text: str, context_str: str, history: str, has_context: bool) -> tuple[str, str]:
+    """Return the (system_prompt, user_prompt) pair sent to the LLM."""
+    system_prompt = "You are SanatanaGPT, an AI assistant and scholarly guide on Hindu scriptures. Structure your answers beautifully using rich Markdown."
+    
+    if has_context:
+        user_prompt = f"""Below is some scripture context that MAY OR MAY NOT be relevant.
+<context>
+{context_str}
+</context>
+
+Instructions:
+1. If the <context> provides the answer or helpful information, use it and cite the text properly (e.g., *(Bhagavad Gita)*).
+2. If the <context> DOES NOT contain the answer (for example, if the user asks about geography, general knowledge, or random facts), you MUST IGNORE the context entirely and use your general knowledge.
+3. ABSOLUTE RULE: If you use your general knowledge, DO NOT apologize. DO NOT mention the scripture. DO NOT say "The provided context does not contain..." or anything similar. Pretend you never received the <context> at all. Just give the answer directly.
+
+Conversation history:
+{history}
+
+User Question: {input_text}"""
+    else:
+        user_prompt = f"""The user asked a question for which no directly relevant scripture passages were found in the database.
+
+Provide a thoughtful answer from your general knowledge. Be clear and honest. Structure your answer beautifully using rich Markdown.
+
+Conversation history:
+{history}
+
+User: {input_text}"""
+
+    return system_prompt, user_prompt
+
+
+def format_message(msg: dict) -> str:
+    return f"{msg['role'].capitalize()}: {msg['content']}\n"
+
+def assemble_prompt(input_text: str, matches: list[dict], history: list[dict], summary: str = "",
+                    budget: int = None) -> dict:
+    """Fit retrieved chunks and conversation history into a token budget.
+
+    History is capped first: the rolling `summary` (standing in for older turns) gets
+    up to PROMPT_SUMMARY_SHARE of the history budget, then the newest turns fill the
+    rest, long answers truncated. The remaining budget is
+    filled with context chunks in rank order (`matches` is best first), dropping the
+    lowest-ranked ones.
+    Returns context_str, sources, history_str, has_scripture_match and prompt_tokens.
+    """
+    if budget is None:
+        budget = settings.PROMPT_TOKEN_BUDGET
+
+    system_prompt, user_prompt = build_prompts(input_text, "", "", bool(matches))
+    remaining = budget - count_tokens(system_prompt) - count_tokens(user_prompt)
+
+    # 1. History — newest first, within its share of the budget
+    history_budget = min(remaining, int(budget * settings.PROMPT_HISTORY_SHARE))
+    summary_line = ""
+    if summary:
+        # Reserved up front: when recent turns are long is exactly when the summary matters
+        summary_budget = int(history_budget * settings.PROMPT_SUMMARY_SHARE)
+        summary_line = truncate_to_tokens(f"Summary of earlier conversation: {summary}\n", summary_budget)
+        cost = count_tokens(summary_line)
+        history_budget -= cost
+        remaining -= cost
+    history_lines = []
+    for msg in reversed(history):
+        line = format_message(msg)
+        cost = count_tokens(line)
+        if cost > history_budget:
+            line = truncate_to_tokens(line, history_budget)
+            cost = count_tokens(line)
+            if not line:
+                break
+        history_lines.append(line)
+        history_budget -= cost
+        remaining -= cost
+        if history_budget <= 0:
+            break
+    history_str = summary_line + "".join(reversed(history_lines))
+
+    # 2. Context — best chunks first, until the budget runs out
+    context_str = ""
+    sources = []
+    for match in matches:
+        block = f"\n[Source: {match['title']}]\n{match['text']}\n"
+        cost = count_tokens(block)
+        if cost > remaining:
+            break
+        context_str += block
+        remaining -= cost
+        text_content = match["text"]
+        sources.append({
+            "type": "scripture",
+            "title": match["title"],
+            "scriptureId": match["scriptureId"],
+            "chunkIndex": match["chunkIndex"],
+            "snippet": text_content[:200] + "..." if len(text_content) > 200 else text_content,
+        })
+
+    has_scripture_match = bool(sources)
+    system_prompt, user_prompt = build_prompts(input_text, context_str, history_str, has_scripture_match)
+    prompt_tokens = count_tokens(system_prompt) + count_tokens(user_prompt)
+    if len(sources) < len(matches):
+        log_event("prompt.chunks_dropped", dropped=len(matches) - len(sources), budget=budget)
+
+    return {
+        "context_str": context_str,
+        "sources": sources,
+        "history_str": history_str,
+        "has_scripture_match": has_scripture_match,
+        "prompt_tokens": prompt_tokens,
+    }
+
+def build_summary_prompt(previous_summary: str, messages: list[dict]) -> tuple[str, str]:
+    """(system_prompt, user_prompt) asking the LLM to fold old turns into the rolling summary."""
+    system_prompt = (
+        "You maintain a running summary of a conversation about Hindu scriptures. "
+        "Respond with ONLY the updated summary, at most 120 words."
+    )
+    turns = "".join(format_message(m) for m in messages)
+    user_prompt = f"""Current summary:
+{previous_summary or "(none)"}
+
+New turns to fold in:
+{turns}"""
+    return system_prompt, user_prompt
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
+from app.core.log import log_event
+
+_model = None
+_lock = threading.Lock()
+
+def get_reranker():
+    global _model
+    with _lock:
+        if _model is None:
+            from sentence_transformers import CrossEncoder
+            _model = CrossEncoder(settings.RERANK_MODEL)
+    return _model
+
+def _score(pairs: list[tuple[str, str]]) -> list[float]:
+    scores = get_reranker().predict(pairs, batch_size=len(pairs))
+    return [float(s) for s in scores]
+
+
+class RerankBatcher:
+    """Merges concurrent re-rank requests into one cross-encoder forward pass.
+
+    Requests that arrive while a pass is running queue up and are scored together in
+    the next one (up to `max_pairs` query/text pairs), so concurrent chats share passes
+    instead of skipping re-ranking. A request whose caller already gave up is dropped
+    before it is scored.
+    """
+
+    def __init__(self, max_pairs: int = 256):
+        self.max_pairs = max_pairs
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self._queue = None
+        self._worker = None
+        self.passes = 0
+        self.pairs = 0
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def score(self, pairs: list[tuple[str, str]]) -> list[float]:
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((pairs, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][0])
+            while not self._queue.empty() and size < self.max_pairs:
+                batch.append(self._queue.get_nowait())
+                size += len(batch[-1][0])
+            batch = [(pairs, future) for pairs, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            flat = [pair for pairs, _ in batch for pair in pairs]
+            self.passes += 1
+            self.pairs += len(flat)
+            try:
+                scores = await loop.run_in_executor(self._executor, _score, flat)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            start = 0
+            for pairs, future in batch:
+                if not future.done():
+                    future.set_result(scores[start:start + len(pairs)])
+                start += len(pairs)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "passes": self.passes,
+            "pairs": self.pairs,
+            "avg_pairs_per_pass": self.pairs / self.passes if self.passes else 0.0,
+        }
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._executor.shutdown(wait=False)
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def get_rerank_batcher() -> RerankBatcher:
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = RerankBatcher(max_pairs=settings.RERANK_MAX_PAIRS)
+    return _batcher
+
+async def close_rerank_batcher():
+    global _batcher
+    if _batcher is not None:
+        await _batcher.close()
+        _batcher = None
+
+
+async def rerank(query: str, results: list[dict], keep: int, budget_ms: float) -> list[dict]:
+    """Re-order `results` with the cross-encoder and keep the best `keep`.
+
+    Scoring shares a batched forward pass with any concurrent requests. If the result
+    isn't back within `budget_ms` (including time queued behind a running pass) or the
+    model fails, the input (vector) order is kept instead.
+    """
+    return (await rerank_many([query], [results], keep, budget_ms))[0]
+
+async def rerank_many(queries: list[str], result_lists: list[list[dict]], keep: int,
+                      budget_ms: float) -> list[list[dict]]:
+    """`rerank` for several queries at once: every query/candidate pair goes into one
+    forward pass, and the fallback to input order applies to all of them together.
+    """
+    pairs = [(query, r.get("text", "")) for query, results in zip(queries, result_lists) for r in results]
+    if not pairs:
+        return result_lists
+
+    started = time.perf_counter()
+    try:
+        scores = await asyncio.wait_for(get_rerank_batcher().score(pairs), timeout=budget_ms / 1000)
+    except asyncio.TimeoutError:
+        log_event("rerank.skipped", logging.WARNING, reason="budget", budget_ms=budget_ms)
+        return [results[:keep] for results in result_lists]
+    except Exception as e:
+        # Model missing or predict failed: answer from vector order rather than failing the request
+        log_event("rerank.skipped", logging.ERROR, reason="error", error=str(e))
+        return [results[:keep] for results in result_lists]
+
+    ranked = []
+    start = 0
+    for results in result_lists:
+        for data, score in zip(results, scores[start:start + len(results)]):
+            data["rerank_score"] = score
+        start += len(results)
+        ranked.append(sorted(results, key=lambda r: r["rerank_score"], reverse=True)[:keep])
+    log_event("rerank.scored", logging.DEBUG, queries=len(queries), candidates=len(pairs),
+              ms=round((time.perf_counter() - started) * 1000, 1))
+    return ranked
@@ -0,0 +1,336 @@
+import logging
+import os
+import tempfile
+import threading
+import numpy as np
+from app.core.log import log_event
+
+# Rows are L2-normalised so a single matmul gives cosine similarity.
+_INITIAL_CAPACITY = 1024
+_SCAN_BLOCK = 4096
+QUANTIZATIONS = ("none", "float16", "int8")
+
+
+def quantize(vectors: np.ndarray, mode: str):
+    """Compact codes for unit vectors: float16, or int8 with one float32 scale per vector."""
+    if mode == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=-1) / 127.0
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    codes = np.round(vectors / scales[..., None]).astype(np.int8)
+    return codes, scales
+
+
+class VectorIndex:
+    """In-process cosine index over `scripture_chunks`, kept in sync by a Firestore listener.
+
+    With quantization, the scan runs over float16 or per-vector scaled int8 codes held in
+    memory; full-precision rows live in a memory-mapped file on disk and are only touched
+    to re-rank the top `limit * rerank_factor` candidates exactly.
+    """
+
+    def __init__(self, dims: int = 768, quantization: str = "none", rerank_factor: int = 10,
+                 storage_dir: str = ""):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"quantization must be one of {QUANTIZATIONS}")
+        self.dims = dims
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        self.storage_dir = storage_dir
+        self._lock = threading.Lock()
+        self._size = 0
+        self._capacity = 0
+        self._matrix = None   # full precision (RAM, or memmap when quantized)
+        self._codes = None    # quantized copy used for the coarse scan
+        self._scales = None   # int8 per-row scale
+        self._allocate(_INITIAL_CAPACITY)
+        self._ids = []        # row -> chunk doc id
+        self._docs = []       # row -> chunk fields (without the embedding)
+        self._rows = {}       # chunk doc id -> row
+        self._watch = None
+        self._listeners = []  # callbacks fed the same chunk changes (see add_listener)
+        self.last_recall = None
+        self.ready = threading.Event()
+
+    def __len__(self):
+        return self._size
+
+    # ─── Storage ─────────────────────────────────────────────────
+    def _allocate(self, capacity: int):
+        """(Re)allocate all row storage to `capacity`, keeping the first `_size` rows."""
+        if self.quantization == "none":
+            matrix = np.zeros((capacity, self.dims), dtype=np.float32)
+        else:
+            directory = self.storage_dir or tempfile.gettempdir()
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"vector_index_{os.getpid()}_{capacity}.f32")
+            matrix = np.memmap(path, dtype=np.float32, mode="w+", shape=(capacity, self.dims))
+        if self._matrix is not None:
+            matrix[:self._size] = self._matrix[:self._size]
+            self._release_matrix()
+        self._matrix = matrix
+
+        if self.quantization != "none":
+            dtype = np.float16 if self.quantization == "float16" else np.int8
+            codes = np.zeros((capacity, self.dims), dtype=dtype)
+            scales = np.ones(capacity, dtype=np.float32)
+            if self._codes is not None:
+                codes[:self._size] = self._codes[:self._size]
+                scales[:self._size] = self._scales[:self._size]
+            self._codes, self._scales = codes, scales
+        self._capacity = capacity
+
+    def _release_matrix(self):
+        if isinstance(self._matrix, np.memmap):
+            path = self._matrix.filename
+            del self._matrix
+            self._matrix = None
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _write_row(self, row: int, vec: np.ndarray):
+        self._matrix[row] = vec
+        if self.quantization != "none":
+            codes, scales = quantize(vec, self.quantization)
+            self._codes[row] = codes
+            if scales is not None:
+                self._scales[row] = scales
+
+    def _copy_row(self, dst: int, src: int):
+        self._matrix[dst] = self._matrix[src]
+        if self.quantization != "none":
+            self._codes[dst] = self._codes[src]
+            self._scales[dst] = self._scales[src]
+
+    def memory_bytes(self) -> int:
+        """Bytes of row storage held in RAM (the memmapped full-precision copy is excluded)."""
+        if self.quantization == "none":
+            return self._size * self.dims * 4
+        per_row = self.dims * (2 if self.quantization == "float16" else 1)
+        per_row += 4 if self.quantization == "int8" else 0
+        return self._size * per_row
+
+    # ─── Mutation ────────────────────────────────────────────────
+    def upsert(self, doc_id: str, data: dict):
+        embedding = data.get("embedding")
+        if embedding is None:
+            return
+        vec = np.asarray(list(embedding), dtype=np.float32)
+        if vec.shape[0] != self.dims:
+            return
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec /= norm
+        fields = {k: v for k, v in data.items() if k != "embedding"}
+
+        with self._lock:
+            row = self._rows.get(doc_id)
+            if row is None:
+                if self._size == self._capacity:
+                    self._allocate(self._capacity * 2)
+                row = self._size
+                self._size += 1
+                self._rows[doc_id] = row
+                self._ids.append(doc_id)
+                self._docs.append(fields)
+            else:
+                self._docs[row] = fields
+            self._write_row(row, vec)
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            row = self._rows.pop(doc_id, None)
+            if row is None:
+                return
+            # Swap the last row into the hole so the matrix stays contiguous
+            last = self._size - 1
+            if row != last:
+                self._copy_row(row, last)
+                self._ids[row] = self._ids[last]
+                self._docs[row] = self._docs[last]
+                self._rows[self._ids[row]] = row
+            self._ids.pop()
+            self._docs.pop()
+            self._size -= 1
+
+    # ─── Query ───────────────────────────────────────────────────
+    @staticmethod
+    def _top(scores: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def _search_rows(self, q: np.ndarray, limit: int, exact: bool = False):
+        """Row ids and exact cosine scores of the best `limit` rows. Caller holds the lock."""
+        n = self._size
+        if self.quantization == "none" or exact:
+            scores = self._matrix[:n] @ q
+            top = self._top(scores, limit)
+            return top, scores[top]
+
+        # Coarse scan over the compact codes, then exact re-rank of the candidates
+        candidates = np.sort(self._top(self._coarse_scores(q, n), limit * self.rerank_factor))
+        exact_scores = self._matrix[candidates] @ q
+        order = self._top(exact_scores, limit)
+        return candidates[order], exact_scores[order]
+
+    def _coarse_scores(self, q: np.ndarray, n: int) -> np.ndarray:
+        # NumPy has no BLAS kernels for int8/float16, so widen block by block
+        scores = np.empty(n, dtype=np.float32)
+        for start in range(0, n, _SCAN_BLOCK):
+            end = min(start + _SCAN_BLOCK, n)
+            scores[start:end] = self._codes[start:end].astype(np.float32) @ q
+        if self.quantization == "int8":
+            scores *= self._scales[:n]
+        return scores
+
+    def search(self, query_vector, limit: int = 5) -> list[dict]:
+        """Return the top `limit` chunks as dicts carrying a cosine `vector_distance`."""
+        q = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm > 0:
+            q = q / norm
+
+        with self._lock:
+            if self._size == 0:
+                return []
+            rows, scores = self._search_rows(q, limit)
+            results = []
+            for row, score in zip(rows, scores):
+                data = dict(self._docs[row])
+                data["id"] = self._ids[row]
+                data["vector_distance"] = float(1.0 - score)
+                results.append(data)
+        return results
+
+    def search_many(self, query_vectors, limit: int = 5) -> list[list[dict]]:
+        """`search` for several queries under one lock; unquantized, it is a single matmul."""
+        q = np.asarray(query_vectors, dtype=np.float32)
+        norms = np.linalg.norm(q, axis=1, keepdims=True)
+        q = q / np.where(norms > 0, norms, 1.0)
+
+        with self._lock:
+            if self._size == 0:
+                return [[] for _ in range(len(q))]
+            if self.quantization == "none":
+                scores = self._matrix[:self._size] @ q.T   # rows x queries
+                ranked = []
+                for col in range(scores.shape[1]):
+                    top = self._top(scores[:, col], limit)
+                    ranked.append((top, scores[top, col]))
+            else:
+                ranked = [self._search_rows(vec, limit) for vec in q]
+
+            results = []
+            for rows, row_scores in ranked:
+                hits = []
+                for row, score in zip(rows, row_scores):
+                    data = dict(self._docs[row])
+                    data["id"] = self._ids[row]
+                    data["vector_distance"] = float(1.0 - score)
+                    hits.append(data)
+                results.append(hits)
+        return results
+
+    def measure_recall(self, samples: int = 100, k: int = 5, seed: int = 0):
+        """Recall@k of the quantized search against exact full-precision search.
+
+        Uses perturbed copies of random indexed vectors as queries.
+        """
+        with self._lock:
+            n = self._size
+            if n == 0 or self.quantization == "none":
+                return None
+            rng = np.random.default_rng(seed)
+            rows = rng.choice(n, size=min(samples, n), replace=False)
+            hits = 0
+            total = 0
+            for row in rows:
+                q = np.array(self._matrix[row]) + rng.normal(0, 0.05, self.dims).astype(np.float32)
+                q /= np.linalg.norm(q)
+                approx, _ = self._search_rows(q, k)
+                exact, _ = self._search_rows(q, k, exact=True)
+                hits += len(set(approx.tolist()) & set(exact.tolist()))
+                total += len(exact)
+        self.last_recall = hits / total if total else None
+        return self.last_recall
+
+    def stats(self) -> dict:
+        return {
+            "size": self._size,
+            "ready": self.ready.is_set(),
+            "quantization": self.quantization,
+            "memory_bytes": self.memory_bytes(),
+            "recall_at_5": self.last_recall,
+        }
+
+    # ─── Firestore sync ──────────────────────────────────────────
+    def add_listener(self, callback):
+        """Share this index's Firestore listener: `callback(upserts, removals)` receives
+        (doc id, fields) pairs and removed doc ids, starting with the chunks loaded so far.
+        """
+        with self._lock:
+            if self.ready.is_set():
+                callback(list(zip(self._ids, self._docs)), [])
+            self._listeners.append(callback)
+
+    def _on_snapshot(self, col_snapshot, changes, read_time):
+        upserts, removals = [], []
+        for change in changes:
+            doc = change.document
+            if change.type.name == "REMOVED":
+                self.remove(doc.id)
+                removals.append(doc.id)
+            else:
+                data = doc.to_dict() or {}
+                self.upsert(doc.id, data)
+                upserts.append((doc.id, {k: v for k, v in data.items() if k != "embedding"}))
+        # Under the lock so add_listener either replays this state or gets these changes
+        with self._lock:
+            first_load = not self.ready.is_set()
+            self.ready.set()
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(upserts, removals)
+            except Exception as e:
+                log_event("vector_index.listener_failed", logging.ERROR, error=str(e))
+        if first_load:
+            log_event("vector_index.loaded", chunks=self._size, quantization=self.quantization)
+            if self.quantization != "none":
+                threading.Thread(target=self._log_recall, daemon=True).start()
+
+    def _log_recall(self):
+        recall = self.measure_recall()
+        if recall is not None:
+            log_event("vector_index.recall", quantization=self.quantization, recall_at_5=round(recall, 3))
+
+    def start(self, db):
+        """Load every chunk and keep the index up to date with incremental changes."""
+        if self._watch is None:
+            self._watch = db.collection("scripture_chunks").on_snapshot(self._on_snapshot)
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+        with self._lock:
+            self._release_matrix()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_vector_index() -> VectorIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            from app.core.config import settings
+            _index = VectorIndex(
+                quantization=settings.VECTOR_INDEX_QUANTIZATION,
+                rerank_factor=settings.VECTOR_INDEX_RERANK_FACTOR,
+                storage_dir=settings.VECTOR_INDEX_DIR,
+            )
+    return _index
@@ -13,7 +13,17 @@ export async function GET(
   try {
     // Fetch directly from FastAPI backend
     const baseUrl = process.env.API_URL && process.env.API_URL !== "undefined" ? process.env.API_URL : "https://sanatanagpt-api-gqx2jph6nq-uc.a.run.app";
-    const res = await fetch(`${baseUrl}/api/scriptures/${id}/download`);
+    // Forward range / conditional headers so resumed and partial downloads work end to end
+    const forwarded = new Headers();
+    for (const name of ['range', 'if-range', 'if-none-match', 'if-modified-since']) {
+      const value = request.headers.get(name);
+      if (value) forwarded.set(name, value);
+    }
+    const res = await fetch(`${baseUrl}/api/scriptures/${id}/download`, { headers: forwarded });
+
+    if (res.status === 304) {
+      return new NextResponse(null, { status: 304, headers: res.headers });
+    }
     
     if (!res.ok) {
       // Try to parse backend error detail if it exists
@@ -34,7 +44,7 @@ export async function GET(
     
     return new NextResponse(res.body, {
       headers,
-      status: 200,
+      status: res.status,  // 200, or 206 for a byte range
     });
   } catch (error) {
     console.error('Download proxy error:', error);
@@ -566,7 +566,7 @@ export default function ScripturesPage() {
                   className="w-full py-3 bg-blue-600 text-white rounded-lg font-medium hover:bg-blue-700 disabled:bg-blue-400 transition-colors flex items-center justify-center gap-2"
                 >
                   {savingEdit ? <Loader2 size={18} className="animate-spin" /> : <Save size={18} />}
-                  {savingEdit ? 'Updating metadata & vector chunks...' : 'Save Changes'}
+                  {savingEdit ? 'Saving...' : 'Save Changes'}
                 </button>
               </div>
             </form>
@@ -37,10 +37,13 @@ export default function Sidebar({ isOpen, onToggle, isMobile }: SidebarProps) {
     );
     
     const unsubscribe = onSnapshot(q, (snapshot) => {
-      const convs = snapshot.docs.map(doc => ({
-        id: doc.id,
-        ...doc.data()
-      }));
+      // Conversations being deleted in the background are hidden straight away
+      const convs = snapshot.docs
+        .filter(doc => !doc.data().deleting)
+        .map(doc => ({
+          id: doc.id,
+          ...doc.data()
+        }));
       setConversations(convs);
       setLoading(false);
     });